@@ -1,21 +1,57 @@
 import streamlit as st
 import os
+import importlib.util
 import logging
-from datetime import datetime
-from pathlib import Path
+import logging.handlers
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Quiet HuggingFace libraries before they are imported
+os.environ.setdefault("TRANSFORMERS_NO_ADVISORY_WARNINGS", "1")
+os.environ.setdefault("HF_HUB_DISABLE_TELEMETRY", "1")
+# Parallel Rust downloader for model weights; huggingface_hub errors if enabled without it
+if importlib.util.find_spec("hf_transfer") is not None:
+    os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
+
+# Size the OpenMP/MKL pools before torch and faiss create them, so the two
+# libraries don't oversubscribe the cores
+NUM_THREADS = max(1, (os.cpu_count() or 2) // 2)
+os.environ.setdefault("OMP_NUM_THREADS", str(NUM_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(NUM_THREADS))
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+def _env_thread_count(name, default):
+    """Value of a thread-count variable if it is a plain positive integer, else default"""
+    # A user's OMP_NUM_THREADS may be any valid OpenMP value, e.g. "4,2" for nested levels
+    try:
+        value = int(os.environ.get(name, ""))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+import faiss
+import torch
 from rag import RAGSystem
 
-# Configure logging
+torch.set_num_threads(_env_thread_count("OMP_NUM_THREADS", NUM_THREADS))
+faiss.omp_set_num_threads(_env_thread_count("OMP_NUM_THREADS", NUM_THREADS))
+
+# Configure logging. The log file is opened lazily (delay=True) and records
+# are buffered in memory, flushed every 100 records or on any warning/error.
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+rotating_file_handler = logging.handlers.RotatingFileHandler(
+    'chatbot.log', maxBytes=5_000_000, backupCount=3, delay=True
+)
+rotating_file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler('chatbot.log'),
+        logging.handlers.MemoryHandler(
+            capacity=100, flushLevel=logging.WARNING, target=rotating_file_handler
+        ),
         logging.StreamHandler()
     ]
 )
@@ -28,13 +64,29 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize session state
-if 'rag_system' not in st.session_state:
+@st.cache_resource
+def get_rag_system() -> RAGSystem:
+    """Create the RAG system once per process and share it across sessions and reruns"""
     logger.info("Initializing RAG system...")
-    st.session_state.rag_system = RAGSystem()
-    st.session_state.rag_system.initialize()
+    rag_system = RAGSystem()
+    rag_system.initialize()
     logger.info("RAG system initialized successfully")
+    return rag_system
+
+rag_system = get_rag_system()
+
+@st.cache_data(ttl=30)
+def get_sidebar_stats(_rag_system: RAGSystem, index_time) -> tuple:
+    """
+    Document count and names for the sidebar, cached per index build
+    
+    index_time (the RAG system's last_index_time) is the cache key, so a
+    rebuild invalidates the cached stats; the leading underscore keeps
+    Streamlit from hashing the RAG system itself.
+    """
+    return _rag_system.get_document_count(), _rag_system.get_loaded_documents()
 
+# Initialize session state
 if 'messages' not in st.session_state:
     st.session_state.messages = []
     logger.info("Chat history initialized")
@@ -47,9 +99,8 @@ with st.sidebar:
     st.title("📊 System Status")
     
     # Vector store status
-    rag_system = st.session_state.rag_system
-    
-    st.metric("Loaded Documents", rag_system.get_document_count())
+    document_count, docs = get_sidebar_stats(rag_system, rag_system.last_index_time)
+    st.metric("Loaded Documents", document_count)
     
     vector_status = "✅ Ready" if rag_system.vector_store_ready else "❌ Not Ready"
     st.metric("Vector Index Status", vector_status)
@@ -59,24 +110,21 @@ with st.sidebar:
     
     st.divider()
     
-    # Rebuild button
-    if st.button("🔄 Rebuild Vector Store", use_container_width=True):
+    # Rebuild button; the rebuild runs in the background and the current index keeps answering
+    if st.button("🔄 Rebuild Vector Store", use_container_width=True, disabled=rag_system.is_rebuilding()):
         logger.info("User requested vector store rebuild")
-        with st.spinner("Rebuilding vector store..."):
-            try:
-                rag_system.rebuild_vector_store()
-                st.success("Vector store rebuilt successfully!")
-                logger.info("Vector store rebuilt successfully")
-                st.rerun()
-            except Exception as e:
-                st.error(f"Error rebuilding vector store: {str(e)}")
-                logger.error(f"Error rebuilding vector store: {str(e)}", exc_info=True)
+        if rag_system.rebuild_vector_store():
+            st.success("Rebuild started. Questions are answered from the current index until it finishes.")
+        else:
+            st.info("A rebuild is already in progress")
+    
+    if rag_system.is_rebuilding():
+        st.caption("🔄 Rebuilding vector store in the background...")
     
     st.divider()
     
     # Document list
     st.subheader("📁 Loaded Documents")
-    docs = rag_system.get_loaded_documents()
     if docs:
         for doc in docs:
             st.text(f"• {doc}")
@@ -96,6 +144,19 @@ with st.sidebar:
 st.title("🤖 AI Onboarding Chatbot")
 st.markdown("Ask me anything about the onboarding documents!")
 
+@st.fragment
+def render_feedback(idx: int):
+    """Thumbs feedback for one assistant message; clicks rerun only this fragment"""
+    sentiment = st.feedback("thumbs", key=f"fb_{idx}")
+    if sentiment is None:
+        return
+    
+    feedback = "positive" if sentiment == 1 else "negative"
+    if st.session_state.feedback.get(idx) != feedback:
+        st.session_state.feedback[idx] = feedback
+        logger.info(f"{feedback.capitalize()} feedback for message {idx}")
+        st.toast("Thanks for your feedback!")
+
 # Display chat messages
 for idx, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
@@ -109,21 +170,11 @@ for idx, message in enumerate(st.session_state.messages):
         
         # Display feedback buttons for assistant messages
         if message["role"] == "assistant":
-            col1, col2, col3 = st.columns([1, 1, 10])
-            with col1:
-                if st.button("👍", key=f"up_{idx}"):
-                    st.session_state.feedback[idx] = "positive"
-                    logger.info(f"Positive feedback for message {idx}")
-                    st.success("Thanks for your feedback!")
-            with col2:
-                if st.button("👎", key=f"down_{idx}"):
-                    st.session_state.feedback[idx] = "negative"
-                    logger.info(f"Negative feedback for message {idx}")
-                    st.info("Thanks for your feedback!")
+            render_feedback(idx)
 
 # Chat input
 if prompt := st.chat_input("Ask a question about onboarding..."):
-    logger.info(f"User query: {prompt}")
+    logger.debug(f"User query: {prompt}")
     
     # Add user message
     st.session_state.messages.append({"role": "user", "content": prompt})
@@ -132,35 +183,36 @@ if prompt := st.chat_input("Ask a question about onboarding..."):
     
     # Generate response
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                logger.info("Generating response...")
-                response, sources = rag_system.query(prompt)
-                logger.info(f"Response generated with {len(sources)} sources")
+        try:
+            logger.debug("Generating response...")
+            with st.spinner("Thinking..."):
+                stream, sources = rag_system.query_stream(prompt)
                 
-                st.markdown(response)
+            # Tokens are rendered as they arrive; the full answer is returned at the end
+            response = st.write_stream(stream)
+            logger.debug(f"Response generated with {len(sources)} sources")
                 
-                # Display sources
-                if sources:
-                    with st.expander("📚 Sources"):
-                        for source in sources:
-                            st.text(f"• {source}")
+            # Display sources
+            if sources:
+                with st.expander("📚 Sources"):
+                    for source in sources:
+                        st.text(f"• {source}")
                 
-                # Add assistant message
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response,
-                    "sources": sources
-                })
+            # Add assistant message
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": response,
+                "sources": sources
+            })
                 
-            except Exception as e:
-                error_msg = f"Error generating response: {str(e)}"
-                st.error(error_msg)
-                logger.error(error_msg, exc_info=True)
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": "I apologize, but I encountered an error processing your request. Please try again."
-                })
+        except Exception as e:
+            error_msg = f"Error generating response: {str(e)}"
+            st.error(error_msg)
+            logger.error(error_msg, exc_info=True)
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": "I apologize, but I encountered an error processing your request. Please try again."
+            })
 
 # Footer
 st.divider()
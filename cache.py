@@ -0,0 +1,311 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+import time
+import hashlib
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Keys per SELECT ... IN (...) query (older SQLite builds allow at most 999 parameters)
+SQLITE_BATCH_SIZE = 500
+
+def _select_in(conn: sqlite3.Connection, query: str, keys: List[Any]) -> Iterable[Tuple]:
+    """
+    Run a SELECT whose "{}" placeholder takes an IN (...) list, over keys in batches
+    
+    Yields the rows of every batch (SQLITE_BATCH_SIZE keys per query).
+    """
+    for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+        batch = keys[start:start + SQLITE_BATCH_SIZE]
+        yield from conn.execute(query.format(','.join('?' * len(batch))), batch)
+
+# Seconds a cached LLM answer stays valid
+ANSWER_TTL = 24 * 60 * 60
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU map
+    
+    Unlike functools.lru_cache, a lookup never computes the value, so callers
+    can check for a hit first and batch the misses (e.g. query embeddings).
+    """
+    
+    def __init__(self, maxsize: int):
+        """
+        Args:
+            maxsize: Number of entries kept (0 disables the cache)
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Any) -> Optional[Any]:
+        """The value stored for key, or None if it isn't cached"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key: Any, value: Any):
+        """Store a value, evicting the least recently used entries beyond maxsize"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+
+class EmbeddingCache:
+    """SQLite-backed store of embedding vectors keyed by model and chunk text"""
+    
+    def __init__(self, db_path: str = os.path.join("cache", "embeddings.db")):
+        """
+        Initialize the embedding cache
+        
+        Args:
+            db_path: Path of the SQLite database file (created if missing)
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+            )
+        logger.info(f"Embedding cache opened: {db_path}")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection; one per call, so the cache can be used from any thread"""
+        return sqlite3.connect(self.db_path, timeout=30)
+    
+    @staticmethod
+    def _key(model_id: str, text: str) -> bytes:
+        """Hash of the model and text; embeddings are deterministic given both"""
+        return hashlib.blake2b(f"{model_id}\0{text}".encode('utf-8'), digest_size=16).digest()
+    
+    def get_many(self, model_id: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up cached embeddings
+        
+        Args:
+            model_id: Identifier of the embedding model (backend and model name)
+            texts: Texts to look up
+        
+        Returns:
+            One float32 vector per text, or None where the text isn't cached
+        """
+        keys = [self._key(model_id, text) for text in texts]
+        found = {}
+        with closing(self._connect()) as conn:
+            for key, dim, vector in _select_in(conn, "SELECT key, dim, vector FROM embeddings WHERE key IN ({})", keys):
+                found[key] = np.frombuffer(vector, dtype=np.float32, count=dim)
+        return [found.get(key) for key in keys]
+    
+    def put_many(self, model_id: str, texts: List[str], embeddings: np.ndarray):
+        """
+        Store embeddings for texts
+        
+        Args:
+            model_id: Identifier of the embedding model (backend and model name)
+            texts: Embedded texts
+            embeddings: One vector per text
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)",
+                (
+                    (self._key(model_id, text), embedding.shape[0], embedding.tobytes())
+                    for text, embedding in zip(texts, embeddings)
+                )
+            )
+        logger.debug(f"Cached {len(texts)} embeddings")
+
+class AnswerCache:
+    """SQLite-backed store of LLM answers keyed by question and retrieved context, with a TTL"""
+    
+    def __init__(self, db_path: str = os.path.join("cache", "answers.db"), ttl: float = ANSWER_TTL):
+        """
+        Initialize the answer cache
+        
+        Args:
+            db_path: Path of the SQLite database file (created if missing)
+            ttl: Seconds before a cached answer expires
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            # Drop expired answers so the file doesn't grow without bound
+            conn.execute("DELETE FROM answers WHERE created < ?", (time.time() - self.ttl,))
+        logger.info(f"Answer cache opened: {db_path}")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection; one per call, so the cache can be used from any thread"""
+        return sqlite3.connect(self.db_path, timeout=30)
+    
+    @staticmethod
+    def key(model: str, question: str, retrieved_docs: List[Dict[str, str]]) -> str:
+        """
+        Build the cache key for a question and the chunks retrieved for it
+        
+        The same question answered from the same context gets the same key,
+        whatever order the chunks were retrieved in. Each chunk contributes a
+        hash of its full text, so an edit anywhere in a chunk changes the key.
+        
+        Args:
+            model: Chat model name
+            question: User's question
+            retrieved_docs: Retrieved document chunks
+        
+        Returns:
+            Hex digest identifying the answer
+        """
+        doc_ids = sorted(
+            f"{doc.get('source', '')}:{hashlib.blake2b(doc['text'].encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()}"
+            for doc in retrieved_docs
+        )
+        payload = f"{model}\0{question}||{','.join(doc_ids)}"
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached answer
+        
+        Args:
+            key: Key from AnswerCache.key
+        
+        Returns:
+            The cached answer, or None if it is missing or expired
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT answer FROM answers WHERE key = ? AND created >= ?",
+                (key, time.time() - self.ttl)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def set(self, key: str, answer: str):
+        """
+        Store an answer
+        
+        Args:
+            key: Key from AnswerCache.key
+            answer: Generated answer
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, created) VALUES (?, ?, ?)",
+                (key, answer, time.time())
+            )
+
+class ChunkStore:
+    """
+    SQLite-backed store of parsed document chunks keyed by content id (CID)
+    
+    A CID identifies a file's contents together with the loader settings that
+    shape its chunks, so identical content is parsed once and reused across
+    rebuilds. A second table remembers each path's size, modification time and
+    content hash, so unchanged files don't need to be read and hashed again.
+    """
+    
+    def __init__(self, db_path: str = os.path.join("cache", "chunks.db")):
+        """
+        Initialize the chunk store
+        
+        Args:
+            db_path: Path of the SQLite database file (created if missing)
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (cid TEXT PRIMARY KEY, source TEXT NOT NULL, chunks_json BLOB NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files "
+                "(path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, content_hash TEXT NOT NULL)"
+            )
+        logger.info(f"Chunk store opened: {db_path}")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection; one per call, so the store can be used from any thread"""
+        return sqlite3.connect(self.db_path, timeout=30)
+    
+    def get_many(self, cids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Look up stored chunks
+        
+        Args:
+            cids: Content ids to look up
+        
+        Returns:
+            Chunks per content id that is stored (missing ids are left out)
+        """
+        with closing(self._connect()) as conn:
+            return {
+                cid: json.loads(chunks_json)
+                for cid, chunks_json in _select_in(conn, "SELECT cid, chunks_json FROM chunks WHERE cid IN ({})", cids)
+            }
+    
+    def put(self, cid: str, source: str, chunks: List[Dict[str, Any]]):
+        """
+        Store the chunks parsed from a file
+        
+        Args:
+            cid: Content id of the file
+            source: File name (kept for inspecting the store)
+            chunks: Parsed chunks
+        """
+        with closing(self._connect()) as conn, conn:
+            # A CID always maps to the same chunks, so an existing row is left as is
+            conn.execute(
+                "INSERT OR IGNORE INTO chunks (cid, source, chunks_json) VALUES (?, ?, ?)",
+                (cid, source, json.dumps(chunks, ensure_ascii=False))
+            )
+    
+    def get_file_hashes(self, paths: List[str]) -> Dict[str, Tuple[int, int, str]]:
+        """
+        Look up the content hashes recorded for files
+        
+        Args:
+            paths: File paths
+        
+        Returns:
+            (size, mtime_ns, content hash) per recorded path
+        """
+        with closing(self._connect()) as conn:
+            return {
+                path: (size, mtime_ns, content_hash)
+                for path, size, mtime_ns, content_hash in _select_in(
+                    conn, "SELECT path, size, mtime_ns, content_hash FROM files WHERE path IN ({})", paths
+                )
+            }
+    
+    def put_file_hashes(self, rows: List[Tuple[str, int, int, str]]):
+        """
+        Record the content hashes of files
+        
+        Args:
+            rows: (path, size, mtime_ns, content hash) tuples
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+                rows
+            )
@@ -6,6 +6,7 @@ This script checks all dependencies and configurations before launching.
 import sys
 import os
 import logging
+import importlib.util
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -32,6 +33,15 @@ def check_environment():
     logger.info(f"✅ HF_TOKEN is set (length: {len(hf_token)})")
     return True
 
+# PDF libraries in the loader's order of preference; any one of them is enough
+# (PyMuPDF releases before 1.24 only provide the "fitz" name)
+PDF_BACKENDS = ['pymupdf', 'fitz', 'pypdf', 'PyPDF2']
+
+def _is_installed(package):
+    """Return True if the package is installed, without importing it"""
+    # find_spec only locates the package; it doesn't run its __init__ (no torch/CUDA startup)
+    return importlib.util.find_spec(package) is not None
+
 def check_dependencies():
     """Check if all required packages are installed"""
     logger.info("Checking dependencies...")
@@ -40,26 +50,28 @@ def check_dependencies():
         'openai',
         'sentence_transformers',
         'faiss',
-        'PyPDF2',
         'PIL',
-        'docx',
+        'lxml',
         'numpy'
     ]
     
     missing = []
     for package in required_packages:
-        try:
-            if package == 'PIL':
-                __import__('PIL')
-            elif package == 'docx':
-                __import__('docx')
-            else:
-                __import__(package)
+        if _is_installed(package):
             logger.info(f"✅ {package} is installed")
-        except ImportError:
+        else:
             logger.error(f"❌ {package} is NOT installed")
             missing.append(package)
     
+    pdf_backend = next((package for package in PDF_BACKENDS if _is_installed(package)), None)
+    if pdf_backend is None:
+        logger.error("❌ No PDF library is installed (PyMuPDF or pypdf)")
+        missing.append('PyMuPDF')
+    elif pdf_backend in ('pypdf', 'PyPDF2'):
+        logger.warning(f"⚠️  PyMuPDF is not installed, PDFs will be read with the slower {pdf_backend}")
+    else:
+        logger.info(f"✅ PyMuPDF is installed ({pdf_backend})")
+    
     if missing:
         logger.error(f"Missing packages: {', '.join(missing)}")
         logger.info("Run: pip install -r requirements.txt")
@@ -79,8 +91,8 @@ def check_docs_folder():
         logger.info("✅ docs folder created")
         return True
     
-    files = list(docs_path.rglob("*"))
-    file_count = len([f for f in files if f.is_file()])
+    # Count lazily instead of materializing every directory entry
+    file_count = sum(1 for f in docs_path.rglob("*") if f.is_file())
     
     if file_count == 0:
         logger.warning("⚠️  docs folder is empty - no documents to process")
@@ -99,6 +111,7 @@ def check_project_files():
         'loader.py',
         'embeddings.py',
         'vector_store.py',
+        'cache.py',
         'requirements.txt'
     ]
     
@@ -1,66 +1,342 @@
+import os
 import logging
+from pathlib import Path
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List
+from typing import List, Optional, Union
+from cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# Model name prefixes that are served by model2vec static embeddings
+STATIC_MODEL_PREFIXES = ("model2vec/", "minishlab/")
+
+def _env_thread_count(name: str, default: int) -> int:
+    """Value of a thread-count variable if it is a plain positive integer, else default"""
+    # OMP_NUM_THREADS may hold any valid OpenMP value, e.g. "4,2" for nested levels
+    try:
+        value = int(os.environ.get(name, ""))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+def _select_device() -> str:
+    """Pick the fastest available torch device (CUDA, then Apple MPS, then CPU)"""
+    import torch
+    
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+class _OnnxInt8Encoder:
+    """Dynamically quantized (int8) ONNX Runtime port of a sentence-transformer model"""
+    
+    def __init__(self, model_name: str, cache_dir: str = "models", max_length: int = 256):
+        """
+        Load the quantized model, exporting and quantizing it first if it isn't cached
+        
+        Args:
+            model_name: sentence-transformers model name or HuggingFace repo id
+            cache_dir: Folder holding exported ONNX models
+            max_length: Maximum sequence length (matches MiniLM's sentence-transformers config)
+        """
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+        
+        repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        export_dir = Path(cache_dir) / f"{repo_id.replace('/', '--')}-int8"
+        model_path = export_dir / "model_quantized.onnx"
+        if not model_path.exists():
+            self._export(repo_id, export_dir)
+        else:
+            logger.info(f"Using cached int8 ONNX model: {model_path}")
+        
+        options = ort.SessionOptions()
+        # Respect the thread budget set by app.py (OMP_NUM_THREADS) when there is one
+        options.intra_op_num_threads = _env_thread_count("OMP_NUM_THREADS", os.cpu_count() or 1)
+        self.session = ort.InferenceSession(
+            str(model_path),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        self.dim = AutoConfig.from_pretrained(export_dir).hidden_size
+        self.max_length = max_length
+    
+    @staticmethod
+    def _export(repo_id: str, export_dir: Path):
+        """Export a HuggingFace model to ONNX and apply dynamic int8 quantization"""
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+        
+        logger.info(f"Exporting {repo_id} to ONNX and quantizing to int8 (one-time step)...")
+        model = ORTModelForFeatureExtraction.from_pretrained(repo_id, export=True)
+        model.save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(repo_id).save_pretrained(export_dir)
+        
+        quantizer = ORTQuantizer.from_pretrained(model)
+        quantizer.quantize(
+            save_dir=export_dir,
+            quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        )
+        logger.info(f"Quantized ONNX model saved to {export_dir}")
+    
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Encode texts with mean pooling and L2 normalization (as all-MiniLM-L6-v2 does)
+        
+        Args:
+            texts: A single text or a list of texts
+            batch_size: Number of texts per ONNX Runtime call
+            show_progress_bar: Accepted for API compatibility, ignored
+        
+        Returns:
+            Numpy array of embeddings (1-D for a single text)
+        """
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        
+        # Sort by length so each batch is padded only to similar-sized texts
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        sorted_texts = [texts[i] for i in order]
+        
+        outputs = []
+        for start in range(0, len(sorted_texts), batch_size):
+            encoded = self.tokenizer(
+                sorted_texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            input_ids = encoded["input_ids"].astype(np.int64)
+            feeds = {
+                name: encoded[name].astype(np.int64) if name in encoded else np.zeros_like(input_ids)
+                for name in self.input_names
+            }
+            token_embeddings = self.session.run(None, feeds)[0]
+            
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(pooled.astype(np.float32))
+        
+        if not outputs:
+            return np.empty((0, self.dim), dtype=np.float32)
+        
+        # Undo the length sort so rows line up with the input order
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        embeddings[order] = np.vstack(outputs)
+        return embeddings[0] if single else embeddings
+
 class EmbeddingModel:
     """Handles text embedding generation using sentence-transformers"""
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        query_cache_size: int = 1024,
+        backend: str = "sentence-transformers"
+    ):
         """
         Initialize the embedding model
         
         Args:
-            model_name: Name of the sentence-transformer model to use
+            model_name: Name of the sentence-transformer model to use. Names starting
+                with "model2vec/" or "minishlab/" load a model2vec static model instead,
+                which skips the transformer forward pass entirely.
+            query_cache_size: Number of query embeddings kept in the LRU cache
+            backend: "sentence-transformers" (PyTorch) or "onnx-int8" (ONNX Runtime with
+                dynamic int8 quantization, exported once to the models/ folder)
         """
         logger.info(f"Loading embedding model: {model_name}")
+        self.model_name = model_name
+        # Static and ONNX backends always run on the CPU
+        self.device = "cpu"
         try:
-            self.model = SentenceTransformer(model_name)
-            self.embedding_dim = self.model.get_sentence_embedding_dimension()
-            logger.info(f"Embedding model loaded successfully. Dimension: {self.embedding_dim}")
+            if model_name.startswith(STATIC_MODEL_PREFIXES):
+                try:
+                    from model2vec import StaticModel
+                except ImportError:
+                    logger.error("model2vec is required for static embedding models")
+                    logger.error("Please install: pip install model2vec")
+                    raise
+                
+                self.backend = "model2vec"
+                # "model2vec/<repo-or-path>" forces the static backend, "minishlab/..." is used as-is
+                repo_id = model_name[len("model2vec/"):] if model_name.startswith("model2vec/") else model_name
+                self.model = StaticModel.from_pretrained(repo_id)
+                self.embedding_dim = self.model.dim
+            elif backend == "onnx-int8":
+                try:
+                    self.backend = "onnx-int8"
+                    self.model = _OnnxInt8Encoder(model_name)
+                except ImportError:
+                    logger.error("optimum and onnxruntime are required for the onnx-int8 backend")
+                    logger.error("Please install: pip install optimum[onnxruntime]")
+                    raise
+                self.embedding_dim = self.model.dim
+            else:
+                self.backend = "sentence-transformers"
+                self.device = _select_device()
+                self.model = SentenceTransformer(model_name, device=self.device)
+                self._apply_bettertransformer()
+                if self.device == "cuda":
+                    # FP16 matmuls run on tensor cores
+                    self.model.half()
+                self.embedding_dim = self.model.get_sentence_embedding_dimension()
+            # Identifies the vectors this model produces (e.g. for the embedding cache)
+            self.model_id = f"{self.backend}:{model_name}"
+            logger.info(
+                f"Embedding model loaded successfully ({self.backend} on {self.device}). "
+                f"Dimension: {self.embedding_dim}"
+            )
+            
+            # Warm up kernels and thread pools now instead of on the first user query
+            self._encode(["warmup"] * 2, batch_size=2)
         except Exception as e:
             logger.error(f"Error loading embedding model: {str(e)}", exc_info=True)
             raise
     
-    def embed_text(self, text: str) -> np.ndarray:
+        # Bound to this instance so cached vectors never outlive (or mix between) models
+        self._query_cache = LRUCache(query_cache_size)
+    
+    def _apply_bettertransformer(self):
+        """Swap the transformer for optimum's BetterTransformer (fused attention kernels) if possible"""
+        try:
+            from optimum.bettertransformer import BetterTransformer
+        except ImportError:
+            logger.info("optimum not installed, using the stock transformer attention")
+            return
+        
+        try:
+            transformer = self.model[0]
+            transformer.auto_model = BetterTransformer.transform(transformer.auto_model, keep_original_model=False)
+            logger.info("BetterTransformer fused attention enabled")
+        except Exception as e:
+            # Recent transformers releases already use fused SDPA attention and are rejected here
+            logger.info(f"BetterTransformer not applied: {str(e)}")
+    
+    def _encode(self, texts: Union[str, List[str]], batch_size: int = 32, show_progress: bool = False) -> np.ndarray:
+        """Run the backend encoder and return a numpy array"""
+        if self.backend != "sentence-transformers":
+            return self.model.encode(texts, batch_size=batch_size, show_progress_bar=show_progress)
+        return self.model.encode(
+            texts,
+            convert_to_numpy=True,
+            batch_size=batch_size,
+            show_progress_bar=show_progress
+        )
+    
+    def embed_text(self, text: str, dtype: np.dtype = np.float32) -> np.ndarray:
         """
         Generate embedding for a single text
         
+        Repeated texts (e.g. the same chat question asked twice) are served from
+        an in-memory LRU cache instead of re-running the encoder.
+        
         Args:
             text: Input text to embed
+            dtype: Output dtype (np.float16 halves the memory of stored vectors)
             
         Returns:
             Numpy array of embeddings
         """
         try:
-            embedding = self.model.encode(text, convert_to_numpy=True)
-            return embedding
+            embedding = self._query_cache.get(text)
+            if embedding is None:
+                embedding = np.asarray(self._encode(text), dtype=np.float32)
+                embedding.setflags(write=False)
+                self._query_cache.put(text, embedding)
+            # astype always copies, so callers can't modify the cached vector in place
+            return embedding.astype(dtype)
         except Exception as e:
             logger.error(f"Error embedding text: {str(e)}", exc_info=True)
             raise
     
-    def embed_batch(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+    def get_cached_embedding(self, text: str, dtype: np.dtype = np.float32) -> Optional[np.ndarray]:
+        """
+        Embedding of a text from the query cache, without encoding it on a miss
+        
+        Returns:
+            A copy of the cached vector, or None if the text isn't cached
+        """
+        embedding = self._query_cache.get(text)
+        return embedding.astype(dtype) if embedding is not None else None
+    
+    def embed_queries(self, texts: List[str], dtype: np.dtype = np.float32) -> np.ndarray:
+        """
+        Generate embeddings for a batch of queries, sharing embed_text's LRU cache
+        
+        Cached texts are served from the cache and only the misses are encoded
+        (in one embed_batch call); the new vectors are cached in turn.
+        
+        Args:
+            texts: Query texts to embed
+            dtype: Output dtype
+        
+        Returns:
+            Numpy array with one embedding per text, owned by the caller
+        """
+        embeddings = [self._query_cache.get(text) for text in texts]
+        misses = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if misses:
+            encoded = {}
+            for text, embedding in zip(misses, self.embed_batch(misses)):
+                embedding.setflags(write=False)
+                self._query_cache.put(text, embedding)
+                encoded[text] = embedding
+            embeddings = [encoded[text] if embedding is None else embedding for text, embedding in zip(texts, embeddings)]
+        
+        if not embeddings:
+            return np.empty((0, self.embedding_dim), dtype=dtype)
+        return np.array(embeddings, dtype=dtype)
+    
+    def embed_batch(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        show_progress: bool = False,
+        dtype: np.dtype = np.float32
+    ) -> np.ndarray:
         """
         Generate embeddings for a batch of texts
         
         Args:
             texts: List of texts to embed
-            batch_size: Batch size for encoding
+            batch_size: Batch size for encoding (defaults to 32 on CPU, 128 on GPU/MPS)
+            show_progress: Show a tqdm progress bar (off by default for server use)
+            dtype: Output dtype (np.float16 halves the memory of stored vectors)
             
         Returns:
-            Numpy array of embeddings
+            Numpy array of embeddings: a new C-contiguous array of the requested
+            dtype, owned by the caller (safe to modify in place)
         """
+        if batch_size is None:
+            batch_size = 32 if self.device == "cpu" else 128
+        
         try:
-            logger.info(f"Embedding batch of {len(texts)} texts...")
-            embeddings = self.model.encode(
-                texts,
-                convert_to_numpy=True,
-                batch_size=batch_size,
-                show_progress_bar=True
+            # Encode each distinct text once (boilerplate chunks repeat across documents)
+            positions = {}
+            inverse = np.fromiter(
+                (positions.setdefault(text, len(positions)) for text in texts),
+                dtype=np.intp,
+                count=len(texts)
             )
-            logger.info(f"Successfully embedded {len(texts)} texts")
+            unique_texts = list(positions)
+            
+            logger.debug(f"Embedding batch of {len(texts)} texts ({len(unique_texts)} unique)...")
+            embeddings = self._encode(unique_texts, batch_size=batch_size, show_progress=show_progress)
+            # A half-precision CUDA model returns float16, so always cast to the requested dtype
+            embeddings = embeddings.astype(dtype, copy=False)
+            if len(unique_texts) < len(texts):
+                embeddings = embeddings[inverse]
+            logger.debug(f"Successfully embedded {len(texts)} texts")
             return embeddings
         except Exception as e:
             logger.error(f"Error embedding batch: {str(e)}", exc_info=True)
@@ -1,30 +1,367 @@
 import os
+import re
+import asyncio
+import bisect
+import hashlib
+import inspect
 import logging
+import mmap
+import multiprocessing
+import shutil
+import subprocess
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict
+from typing import Any, Iterator, List, Dict, Optional, Tuple, Union
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-import PyPDF2
 from PIL import Image
 import base64
 from io import BytesIO
-from openai import OpenAI
-import docx
+from openai import OpenAI, AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from lxml import etree
+import numpy as np
+from cache import ChunkStore
+
+# SIMD base64 codec for image/frame payloads; falls back to the stdlib encoder
+try:
+    import pybase64
+except ImportError:
+    pybase64 = None
+
+# orjson serializes the large base64 vision request bodies several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Posting the orjson body needs the content= argument of the client's post(), which
+# older openai releases lack; those go through chat.completions.create instead
+ORJSON_REQUESTS = orjson is not None and all(
+    'content' in inspect.signature(client_class.post).parameters for client_class in (OpenAI, AsyncOpenAI)
+)
+
+# PyMuPDF is preferred for PDFs; releases before 1.24 only provide the "fitz" name
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+# Pure-Python PDF fallback: pypdf, or the deprecated PyPDF2 it replaced (same PdfReader API)
+try:
+    import pypdf
+except ImportError:
+    try:
+        import PyPDF2 as pypdf
+    except ImportError:
+        pypdf = None
 
 logger = logging.getLogger(__name__)
 
+# PyMuPDF isn't thread-safe (and holds the GIL while extracting), so PDFs with at least
+# this many pages are split into page ranges extracted by separate processes instead
+PDF_PARALLEL_MIN_PAGES = 200
+
+# Largest frame gap skipped with sequential grab() calls; longer gaps seek instead
+VIDEO_MAX_GRAB_GAP = 90
+
+# JPEG quality for video frames sent to the vision model (about half the bytes of the default 95)
+VIDEO_FRAME_JPEG_QUALITY = 80
+
+# Longest side, in pixels, of frames and images sent to the vision model; larger
+# inputs are downscaled since the model works at roughly this resolution anyway
+VIDEO_FRAME_MAX_SIDE = 512
+IMAGE_MAX_SIDE = 768
+
+# JPEG quality used when re-encoding a downscaled image
+IMAGE_JPEG_QUALITY = 85
+
+# Images within IMAGE_MAX_SIDE are sent as-is unless the file is larger than this
+# (e.g. lossless PNG screenshots), in which case they are re-encoded as JPEG too
+IMAGE_PASSTHROUGH_MAX_BYTES = 256 * 1024
+
+# Frames whose 64-bit dHash differs from the last captioned frame in at most this
+# many bits are treated as the same scene and reuse its description
+VIDEO_FRAME_DEDUP_DISTANCE = 5
+
+# Version of the extraction output; bump it when a loader change alters the chunks
+# produced for the same file, so stale cache entries are no longer used
+LOADER_VERSION = 2
+
+# Block size used to hash file contents for their content id
+CACHE_HASH_BLOCK_SIZE = 1 << 20
+
+# Extensions whose loaders are CPU-bound (text extraction) and run in worker
+# processes; images and videos wait on the vision API and run on threads
+CPU_BOUND_EXTENSIONS = frozenset(['.txt', '.pdf', '.docx', '.doc'])
+
+# Extensions loaded as images and captioned together with the async client
+IMAGE_EXTENSIONS = frozenset(['.png', '.jpg', '.jpeg'])
+
+# Images described per vision request, and the most requests in flight at once
+IMAGE_CAPTION_BATCH_SIZE = 8
+IMAGE_CAPTION_CONCURRENCY = 20
+
+# Caption prompts for single and batched image requests
+IMAGE_PROMPT = "Describe this image in detail. Focus on any text, diagrams, charts, or important information visible in the image."
+IMAGE_BATCH_PROMPT = (
+    "You are given {count} images, each preceded by its label (IMG_1, IMG_2, ...). "
+    "Describe each image separately in detail. Focus on any text, diagrams, charts, or important "
+    "information visible in it. Start each description on a new line with its label and a colon, "
+    "for example \"IMG_1: ...\"."
+)
+
+# WordprocessingML tags read from a DOCX's main document part
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+DOCX_BODY, DOCX_PARAGRAPH, DOCX_TABLE = f"{_W}body", f"{_W}p", f"{_W}tbl"
+DOCX_RUN, DOCX_HYPERLINK, DOCX_TEXT, DOCX_BREAK = f"{_W}r", f"{_W}hyperlink", f"{_W}t", f"{_W}br"
+
+# Text of the other run elements included in a paragraph's text (as python-docx maps them)
+DOCX_RUN_SYMBOLS = {
+    f"{_W}tab": "\t",
+    f"{_W}ptab": "\t",
+    f"{_W}cr": "\n",
+    f"{_W}noBreakHyphen": "-",
+}
+
+# Relationship type of a DOCX package's main document part
+DOCX_OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+# Sentence-ending punctuation; chunks break just after a mark that is followed by whitespace
+SENTENCE_END_CODEPOINTS = (ord('.'), ord('!'), ord('?'))
+
+# Lookup table of whitespace code points (the same set the regex \s matches). None lie
+# above U+3000, so higher code points are clipped to the final entry, which is False
+_WHITESPACE_TABLE = np.zeros(0x3002, dtype=bool)
+_WHITESPACE_TABLE[[c for c in range(0x3001) if chr(c).isspace()]] = True
+
+# Matches the "IMG_i:" labels that start each description in a batched response
+IMAGE_LABEL_PATTERN = re.compile(r'^[\s*#]*IMG_(\d+)[\s*]*:[\s*]*', re.MULTILINE)
+
+# Serializes loading and use of the shared Whisper model across threads
+_whisper_lock = threading.Lock()
+
+# Loaders created inside worker processes, keyed by their configuration
+_worker_loaders = {}
+
+# Worker processes are spawned rather than forked: the app process already runs
+# Streamlit, event-loop, rebuild and torch/OpenMP threads, and forking a
+# multi-threaded process can deadlock the child. Workers rebuild their loader
+# from _worker_config, so they need nothing inherited from the parent
+_PROCESS_CONTEXT = multiprocessing.get_context("spawn")
+
+def _b64encode(data) -> str:
+    """Base64-encode a bytes-like object to str, using pybase64 when it is installed"""
+    if pybase64 is not None:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode('utf-8')
+
+@lru_cache(maxsize=None)
+def _get_whisper_model(name: str) -> Tuple[str, Any]:
+    """
+    Load a Whisper model once per process and share it between loaders and videos
+    
+    faster-whisper (CTranslate2, float16 on CUDA and int8 on CPU) is used when
+    installed; otherwise the reference openai-whisper package is loaded.
+    
+    Args:
+        name: Whisper model name (base, small, medium, large)
+    
+    Returns:
+        Tuple of (backend name, model)
+    """
+    try:
+        import ctranslate2
+        from faster_whisper import WhisperModel
+    except ImportError:
+        import whisper
+    
+        logger.info(f"Loading Whisper model: {name} (openai-whisper)")
+        model = whisper.load_model(name)
+        logger.info(f"Whisper model loaded successfully on {model.device}")
+        return "openai-whisper", model
+    
+    if ctranslate2.get_cuda_device_count() > 0:
+        device, compute_type = "cuda", "float16"
+    else:
+        device, compute_type = "cpu", "int8"
+    logger.info(f"Loading Whisper model: {name} (faster-whisper, {compute_type} on {device})")
+    model = WhisperModel(name, device=device, compute_type=compute_type)
+    logger.info("Whisper model loaded successfully")
+    return "faster-whisper", model
+
+def _has_audio_stream(file_path: Path) -> bool:
+    """Whether a media file has an audio stream, according to ffprobe"""
+    process = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'a', '-show_entries', 'stream=index',
+         '-of', 'csv=p=0', str(file_path)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+    return bool(process.stdout.strip())
+
+def _decode_audio(file_path: Path):
+    """
+    Decode the audio track of a media file to 16 kHz mono float32 samples
+    
+    ffmpeg writes raw PCM to a pipe (-vn skips decoding the video stream), so
+    the Whisper backend gets an in-memory array instead of re-opening the file.
+    """
+    process = subprocess.run(
+        ['ffmpeg', '-nostdin', '-threads', '0', '-i', str(file_path), '-vn',
+         '-f', 's16le', '-ac', '1', '-ar', '16000', '-loglevel', 'error', '-'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+    return np.frombuffer(process.stdout, np.int16).astype(np.float32) / 32768.0
+
+def _transcribe(backend: str, model: Any, audio: Union[str, Any]) -> Dict[str, Any]:
+    """
+    Transcribe audio with a Whisper backend
+    
+    Args:
+        backend: Backend name returned by _get_whisper_model
+        model: Whisper model returned by _get_whisper_model
+        audio: Path of a media file, or 16 kHz mono float32 samples
+    
+    Returns:
+        Dict with 'text', 'language' and 'segments' (dicts with 'start', 'end'
+        and 'text'), the shape openai-whisper returns
+    """
+    if backend == "faster-whisper":
+        segments, info = model.transcribe(audio, beam_size=1, vad_filter=True)
+        # segments is a lazy generator; iterating it runs the decoding
+        segments = [
+            {'start': segment.start, 'end': segment.end, 'text': segment.text}
+            for segment in segments
+        ]
+        return {
+            'text': "".join(segment['text'] for segment in segments),
+            'language': info.language,
+            'segments': segments
+        }
+    
+    return model.transcribe(
+        audio,
+        verbose=True,  # Enable verbose for debugging
+        word_timestamps=False,
+        fp16=model.device.type == "cuda"  # FP16 is only supported on the GPU
+    )
+
+def _sentence_ends(text: str) -> List[int]:
+    """
+    Offsets just past every sentence-ending punctuation mark followed by whitespace
+    
+    The text is viewed as an array of code points (one byte each for ASCII text,
+    otherwise UTF-32) and all boundaries are found with vectorized comparisons
+    instead of a Python-level scan. Lone surrogates, which PDF extraction can
+    return for fonts with broken ToUnicode maps, are kept as their code points.
+    """
+    if text.isascii():
+        codepoints = np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+        following = codepoints[1:]
+    else:
+        codepoints = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        following = np.minimum(codepoints[1:], len(_WHITESPACE_TABLE) - 1)
+    
+    marks = np.isin(codepoints[:-1], SENTENCE_END_CODEPOINTS)
+    return (np.flatnonzero(marks & _WHITESPACE_TABLE[following]) + 1).tolist()
+
+def _docx_paragraph_text(paragraph) -> str:
+    """
+    Text of a w:p element: its runs and hyperlinked runs, in document order
+    
+    Matches python-docx's Paragraph.text: tabs become tab characters, line
+    breaks become newlines, and page and column breaks are dropped.
+    """
+    parts = []
+    for child in paragraph:
+        if child.tag == DOCX_RUN:
+            runs = (child,)
+        elif child.tag == DOCX_HYPERLINK:
+            runs = child.iterchildren(DOCX_RUN)
+        else:
+            continue
+        
+        for run in runs:
+            for element in run:
+                if element.tag == DOCX_TEXT:
+                    parts.append(element.text or "")
+                elif element.tag == DOCX_BREAK:
+                    if element.get(f"{_W}type", "textWrapping") == "textWrapping":
+                        parts.append("\n")
+                elif element.tag in DOCX_RUN_SYMBOLS:
+                    parts.append(DOCX_RUN_SYMBOLS[element.tag])
+    return "".join(parts)
+
+def _dhash(frame) -> int:
+    """64-bit difference hash of a BGR frame (neighbouring-pixel brightness gradients)"""
+    import cv2
+    
+    gray = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(gray[:, 1:] > gray[:, :-1]).tobytes(), 'big')
+
+def _image_content(image_base64: str, mime_type: str) -> Dict[str, Any]:
+    """Chat content part carrying a base64-encoded image as a data: URL"""
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:{mime_type};base64,{image_base64}"
+        }
+    }
+
+def _extract_pdf_page_range(path_str: str, start: int, stop: int) -> List[str]:
+    """
+    Extract the text of pages [start, stop) of a PDF with PyMuPDF in a worker process
+    
+    Each process opens its own Document, which is how PyMuPDF supports
+    concurrency; Documents and Pages must never be shared between threads.
+    """
+    with pymupdf.open(path_str) as doc:
+        return [doc[page_num].get_text("text", flags=pymupdf.TEXTFLAGS_TEXT) for page_num in range(start, stop)]
+
+def _load_file_worker(path_str: str, config: Dict[str, Any]) -> Tuple[List[Dict[str, str]], bool]:
+    """
+    Load a single file in a worker process
+    
+    Module-level so it can be pickled by ProcessPoolExecutor. Each process
+    builds one DocumentLoader per configuration and reuses it, so the OpenAI
+    client is created once per worker (the Whisper model is cached per process).
+    """
+    key = tuple(sorted(config.items()))
+    loader = _worker_loaders.get(key)
+    if loader is None:
+        loader = DocumentLoader(**config, num_workers=1)
+        _worker_loaders[key] = loader
+    return loader._process_file(Path(path_str))
+
 class DocumentLoader:
     """Handles loading and processing of various document types"""
     
+    # Shared by all loaders; a frozenset gives O(1) extension lookups while scanning
+    SUPPORTED_EXTENSIONS = frozenset(['.txt', '.pdf', '.png', '.jpg', '.jpeg', '.docx', '.doc', '.mp4'])
+    
     def __init__(
         self, 
         docs_folder: str = "docs",
         video_frame_interval: int = 5,
         video_max_frames: int = 50,
-        whisper_model: str = "base"
+        whisper_model: str = "base",
+        num_workers: Optional[int] = None,
+        io_workers: int = 8,
+        caption_workers: int = 8,
+        chunk_db_path: Optional[str] = os.path.join("cache", "chunks.db")
     ):
         """
         Initialize document loader
@@ -34,14 +371,23 @@ class DocumentLoader:
             video_frame_interval: Seconds between frame extractions for videos
             video_max_frames: Maximum number of frames to extract per video
             whisper_model: Whisper model to use for audio transcription (base, small, medium, large)
+            num_workers: Number of processes used to load text, PDF and Word files (defaults to
+                the CPU count, 1 loads them in this process)
+            io_workers: Number of threads used to load videos, which mostly wait on the vision API
+            caption_workers: Maximum concurrent vision-model requests when captioning video frames
+            chunk_db_path: SQLite chunk store of already processed files (None disables caching)
         """
         self.docs_folder = docs_folder
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.io_workers = io_workers
         self.loaded_files = []
-        self.supported_extensions = ['.txt', '.pdf', '.png', '.jpg', '.jpeg', '.docx', '.doc', '.mp4']
+        self.incomplete_files = []
         self.video_frame_interval = video_frame_interval
         self.video_max_frames = video_max_frames
         self.whisper_model_name = whisper_model
-        self.whisper_model = None  # Lazy load when needed
+        self.caption_workers = caption_workers
+        self.chunk_db_path = chunk_db_path
+        self.chunk_store = ChunkStore(chunk_db_path) if chunk_db_path else None
         
         # Create docs folder if it doesn't exist
         os.makedirs(self.docs_folder, exist_ok=True)
@@ -65,12 +411,17 @@ class DocumentLoader:
         """
         Load all supported documents from the docs folder
         
+        Afterwards loaded_files lists the files that produced chunks, and
+        incomplete_files the files that failed to load or whose captions or
+        transcription failed (these are loaded again next time).
+        
         Returns:
             List of document chunks with metadata
         """
         logger.info(f"Scanning {self.docs_folder} for documents...")
         all_chunks = []
         self.loaded_files = []
+        self.incomplete_files = []
         
         # Get all files in docs folder
         docs_path = Path(self.docs_folder)
@@ -78,24 +429,228 @@ class DocumentLoader:
             logger.warning(f"Docs folder {self.docs_folder} does not exist")
             return all_chunks
         
-        files = list(docs_path.rglob("*"))
-        logger.info(f"Found {len(files)} total files")
+        eligible = list(self._scan_files(self.docs_folder, self.SUPPORTED_EXTENSIONS))
+        logger.info(f"Found {len(eligible)} supported files")
         
-        for file_path in files:
-            if file_path.is_file() and file_path.suffix.lower() in self.supported_extensions:
-                try:
-                    logger.info(f"Processing file: {file_path.name}")
-                    chunks = self._load_file(file_path)
-                    all_chunks.extend(chunks)
-                    self.loaded_files.append(file_path.name)
-                    logger.info(f"Successfully loaded {file_path.name} ({len(chunks)} chunks)")
-                except Exception as e:
-                    logger.error(f"Error loading {file_path.name}: {str(e)}", exc_info=True)
+        # Chunks per file; assembled in scan order below so the index is deterministic
+        results = {}
+        
+        # Files whose content id is already in the chunk store are not parsed again
+        content_ids = {}
+        if self.chunk_store is not None:
+            content_ids = self._content_ids(eligible)
+            stored = self.chunk_store.get_many(list(set(content_ids.values())))
+            for file_path in eligible:
+                if content_ids.get(file_path) in stored:
+                    results[file_path] = stored[content_ids[file_path]]
+            logger.info(f"Using stored chunks for {len(results)} unchanged files")
+        pending = [file_path for file_path in eligible if file_path not in results]
+        
+        # CPU-bound extraction goes to worker processes; videos (network round-trips
+        # to the vision model) go to threads sharing this loader's client, and all
+        # images are captioned concurrently on one event loop
+        cpu_files = [file_path for file_path in pending if file_path.suffix.lower() in CPU_BOUND_EXTENSIONS]
+        image_files = [file_path for file_path in pending if file_path.suffix.lower() in IMAGE_EXTENSIONS]
+        io_files = [
+            file_path for file_path in pending
+            if file_path.suffix.lower() not in CPU_BOUND_EXTENSIONS and file_path.suffix.lower() not in IMAGE_EXTENSIONS
+        ]
+        
+        num_processes = min(self.num_workers, len(cpu_files))
+        # One extra thread runs the image event loop
+        num_threads = max(1, min(self.io_workers, len(io_files))) + 1
+        
+        with ThreadPoolExecutor(max_workers=num_threads) as thread_pool:
+            image_future = thread_pool.submit(self._load_images, image_files)
+            futures = {}
+            for file_path in io_files:
+                logger.info(f"Processing file: {file_path.name}")
+                futures[thread_pool.submit(self._process_file, file_path)] = file_path
+                
+            if num_processes > 1:
+                logger.info(f"Loading {len(cpu_files)} files with {num_processes} worker processes")
+                config = self._worker_config()
+                with ProcessPoolExecutor(max_workers=num_processes, mp_context=_PROCESS_CONTEXT) as process_pool:
+                    for file_path in cpu_files:
+                        logger.info(f"Processing file: {file_path.name}")
+                        futures[process_pool.submit(_load_file_worker, str(file_path), config)] = file_path
+                    self._collect_results(futures, results, content_ids)
+            else:
+                for file_path in cpu_files:
+                    try:
+                        logger.info(f"Processing file: {file_path.name}")
+                        self._store_result(file_path, *self._process_file(file_path), results, content_ids)
+                        logger.info(f"Successfully loaded {file_path.name} ({len(results[file_path])} chunks)")
+                    except Exception as e:
+                        logger.error(f"Error loading {file_path.name}: {str(e)}", exc_info=True)
+                        self.incomplete_files.append(file_path.name)
+                self._collect_results(futures, results, content_ids)
+            for file_path, (chunks, complete) in image_future.result().items():
+                self._store_result(file_path, chunks, complete, results, content_ids)
+        
+        # Only files that produced chunks are listed (e.g. images and videos
+        # without HF_TOKEN are left out alike)
+        for file_path in eligible:
+            if results.get(file_path):
+                all_chunks.extend(results[file_path])
+                self.loaded_files.append(file_path.name)
         
         logger.info(f"Total documents loaded: {len(self.loaded_files)}, Total chunks: {len(all_chunks)}")
         return all_chunks
     
-    def _load_file(self, file_path: Path) -> List[Dict[str, str]]:
+    def corpus_fingerprint(self) -> str:
+        """
+        Cheap fingerprint of the documents load_all_documents would read
+        
+        A blake2b hash of every supported file's relative path, size and
+        modification time (stat only, no file contents), plus LOADER_VERSION and
+        the settings that change the chunks. It changes whenever a file is added,
+        removed or edited, so an index saved with it can be reused until then.
+        """
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(
+            f"{LOADER_VERSION}|{self.video_frame_interval}|{self.video_max_frames}|{self.whisper_model_name}".encode()
+        )
+        if os.path.isdir(self.docs_folder):
+            entries = []
+            for file_path in self._scan_files(self.docs_folder, self.SUPPORTED_EXTENSIONS):
+                stat = file_path.stat()
+                entries.append((os.path.relpath(file_path, self.docs_folder), stat.st_size, stat.st_mtime_ns))
+            for relative_path, size, mtime_ns in sorted(entries):
+                hasher.update(f"\0{relative_path}|{size}|{mtime_ns}".encode('utf-8', 'surrogateescape'))
+        return hasher.hexdigest()
+    
+    def _collect_results(
+        self,
+        futures: Dict[Any, Path],
+        results: Dict[Path, List[Dict[str, str]]],
+        content_ids: Dict[Path, str]
+    ):
+        """Store each file's chunks in results as its load future finishes"""
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                self._store_result(file_path, *future.result(), results, content_ids)
+                logger.info(f"Successfully loaded {file_path.name} ({len(results[file_path])} chunks)")
+            except Exception as e:
+                logger.error(f"Error loading {file_path.name}: {str(e)}", exc_info=True)
+                self.incomplete_files.append(file_path.name)
+    
+    def _store_result(
+        self,
+        file_path: Path,
+        chunks: List[Dict[str, str]],
+        complete: bool,
+        results: Dict[Path, List[Dict[str, str]]],
+        content_ids: Dict[Path, str]
+    ):
+        """Record a newly parsed file's chunks, and save them in the chunk store as soon as they exist"""
+        results[file_path] = chunks
+        if not complete:
+            self.incomplete_files.append(file_path.name)
+        # Empty or partial results (no HF_TOKEN, a failed caption or transcription) are
+        # used for this build only, so the file is processed again on the next one
+        if chunks and complete and file_path in content_ids:
+            try:
+                self.chunk_store.put(content_ids[file_path], file_path.name, chunks)
+            except Exception as e:
+                logger.warning(f"Could not store chunks for {file_path.name}: {str(e)}")
+    
+    def _scan_files(self, root: str, extensions: frozenset) -> Iterator[Path]:
+        """
+        Recursively yield the files under root whose extension is in extensions
+        
+        os.scandir returns each entry's type with the directory listing, so
+        (unlike rglob followed by is_file) no extra stat call is made per file.
+        Directory symlinks are not followed, matching rglob.
+        """
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self._scan_files(entry.path, extensions)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in extensions:
+                    yield Path(entry.path)
+    
+    def _worker_config(self) -> Dict[str, Any]:
+        """Constructor arguments for rebuilding this loader inside a worker process"""
+        return {
+            'docs_folder': self.docs_folder,
+            'video_frame_interval': self.video_frame_interval,
+            'video_max_frames': self.video_max_frames,
+            'whisper_model': self.whisper_model_name,
+            'caption_workers': self.caption_workers,
+            # The main process reads and writes the chunk store
+            'chunk_db_path': None,
+        }
+    
+    def _content_ids(self, file_paths: List[Path]) -> Dict[Path, str]:
+        """
+        Content id of each file: a hash of its bytes, LOADER_VERSION and its name
+        
+        Touching or copying a file keeps its id; editing it or upgrading the
+        loader does not. The file name (stored in each chunk's source) and the
+        loader settings that change the output (video sampling, Whisper model)
+        are part of the id too. Content hashes are remembered per path, size and
+        modification time, so only new or modified files are read and hashed.
+        
+        Files that can't be read are left out; they then take the normal load
+        path, which logs the error and skips them.
+        """
+        stats = {}
+        for file_path in file_paths:
+            try:
+                stats[file_path] = file_path.stat()
+            except OSError as e:
+                logger.error(f"Cannot read {file_path.name}: {str(e)}")
+        known = self.chunk_store.get_file_hashes([str(file_path) for file_path in stats])
+        
+        content_hashes = {}
+        changed = []
+        for file_path, stat in stats.items():
+            record = known.get(str(file_path))
+            if record is not None and record[:2] == (stat.st_size, stat.st_mtime_ns):
+                content_hashes[file_path] = record[2]
+            else:
+                changed.append(file_path)
+        
+        if changed:
+            logger.info(f"Hashing {len(changed)} new or modified files")
+            # hashlib releases the GIL while hashing large blocks
+            with ThreadPoolExecutor(max_workers=max(1, min(self.io_workers, len(changed)))) as executor:
+                hashed = {
+                    file_path: content_hash
+                    for file_path, content_hash in zip(changed, executor.map(self._content_hash, changed))
+                    if content_hash is not None
+                }
+            content_hashes.update(hashed)
+            self.chunk_store.put_file_hashes([
+                (str(file_path), stats[file_path].st_size, stats[file_path].st_mtime_ns, content_hash)
+                for file_path, content_hash in hashed.items()
+            ])
+        
+        settings = f"|{LOADER_VERSION}|{self.video_frame_interval}|{self.video_max_frames}|{self.whisper_model_name}"
+        return {
+            file_path: hashlib.blake2b(
+                f"{content_hashes[file_path]}|{file_path.name}{settings}".encode('utf-8', 'surrogateescape'),
+                digest_size=20
+            ).hexdigest()
+            for file_path in content_hashes
+        }
+    
+    @staticmethod
+    def _content_hash(file_path: Path) -> Optional[str]:
+        """blake2b hash of a file's bytes, or None if it can't be read"""
+        hasher = hashlib.blake2b(digest_size=20)
+        try:
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(CACHE_HASH_BLOCK_SIZE), b''):
+                    hasher.update(block)
+        except OSError as e:
+            logger.error(f"Cannot read {file_path.name}: {str(e)}")
+            return None
+        return hasher.hexdigest()
+    
+    def _process_file(self, file_path: Path) -> Tuple[List[Dict[str, str]], bool]:
         """
         Load a single file based on its extension
         
@@ -103,23 +658,24 @@ class DocumentLoader:
             file_path: Path to the file
             
         Returns:
-            List of document chunks
+            Tuple of (list of document chunks, whether they are complete). Chunks
+            are incomplete when a caption or transcription request failed
         """
         extension = file_path.suffix.lower()
         
         if extension == '.txt':
-            return self._load_text(file_path)
+            return self._load_text(file_path), True
         elif extension == '.pdf':
-            return self._load_pdf(file_path)
-        elif extension in ['.png', '.jpg', '.jpeg']:
-            return self._load_image(file_path)
+            return self._load_pdf(file_path), True
+        elif extension in IMAGE_EXTENSIONS:
+            return self._load_images([file_path]).get(file_path, ([], True))
         elif extension in ['.docx', '.doc']:
-            return self._load_docx(file_path)
+            return self._load_docx(file_path), True
         elif extension == '.mp4':
             return self._load_video(file_path)
         else:
             logger.warning(f"Unsupported file type: {extension}")
-            return []
+            return [], True
     
     def _load_text(self, file_path: Path) -> List[Dict[str, str]]:
         """Load and chunk a text file"""
@@ -136,95 +692,235 @@ class DocumentLoader:
     def _load_pdf(self, file_path: Path) -> List[Dict[str, str]]:
         """Load and chunk a PDF file"""
         try:
-            text = ""
-            with open(file_path, 'rb') as f:
-                pdf_reader = PyPDF2.PdfReader(f)
-                logger.info(f"PDF has {len(pdf_reader.pages)} pages")
-                
-                for page_num, page in enumerate(pdf_reader.pages):
-                    page_text = page.extract_text()
-                    text += f"\n[Page {page_num + 1}]\n{page_text}"
+            if pymupdf is not None:
+                page_texts = self._extract_pdf_pages_pymupdf(file_path)
+            elif pypdf is not None:
+                page_texts = self._extract_pdf_pages_pypdf(file_path)
+            else:
+                logger.error(f"Cannot load PDF {file_path.name}: no PDF library installed")
+                logger.error("Please install: pip install PyMuPDF (or pypdf)")
+                return []
             
-            chunks = self._chunk_text(text, file_path.name)
+            # Chunk each page as it is extracted rather than joining the whole
+            # document into one string first; chunks never span two pages
+            chunks = []
+            for page_num, page_text in enumerate(page_texts, start=1):
+                if not page_text.strip():
+                    continue
+                for chunk_text in self._split_text(f"[Page {page_num}]\n{page_text}"):
+                    chunks.append({
+                        'text': chunk_text,
+                        'source': file_path.name,
+                        'type': 'text',
+                        'page': page_num
+                    })
+            
+            if chunks:
+                logger.info(f"Created {len(chunks)} chunks from {file_path.name}")
+            else:
+                logger.warning(f"Empty text from {file_path.name}")
             return chunks
         except Exception as e:
             logger.error(f"Error loading PDF {file_path.name}: {str(e)}", exc_info=True)
             return []
     
-    def _load_image(self, file_path: Path) -> List[Dict[str, str]]:
-        """Load an image and generate caption using vision model"""
-        try:
-            if not self.client:
-                logger.warning(f"Cannot process image {file_path.name}: HF_TOKEN not set")
-                return []
-            
-            logger.info(f"Generating caption for image: {file_path.name}")
+    def _extract_pdf_pages_pymupdf(self, file_path: Path) -> Iterator[str]:
+        """Yield the text of each PDF page with PyMuPDF (C-backed, much faster than pypdf)"""
+        with pymupdf.open(str(file_path)) as doc:
+            page_count = doc.page_count
+            logger.info(f"PDF has {page_count} pages")
             
-            # Read and encode image
-            with open(file_path, 'rb') as f:
-                image_data = f.read()
+            # Inside a worker process (or with num_workers=1) pages are extracted in
+            # order here, since other files already occupy the other cores
+            parallel = (
+                page_count >= PDF_PARALLEL_MIN_PAGES
+                and self.num_workers > 1
+                and multiprocessing.parent_process() is None
+            )
+            if not parallel:
+                for page in doc:
+                    # TEXTFLAGS_TEXT skips image and layout extraction work
+                    yield page.get_text("text", flags=pymupdf.TEXTFLAGS_TEXT)
+                return
+        
+        num_processes = self.num_workers
+        logger.info(f"Extracting {file_path.name} with {num_processes} processes")
+        bounds = [page_count * i // num_processes for i in range(num_processes + 1)]
+        with ProcessPoolExecutor(max_workers=num_processes, mp_context=_PROCESS_CONTEXT) as executor:
+            for page_texts in executor.map(
+                _extract_pdf_page_range, [str(file_path)] * num_processes, bounds[:-1], bounds[1:]
+            ):
+                yield from page_texts
+    
+    def _extract_pdf_pages_pypdf(self, file_path: Path) -> Iterator[str]:
+        """
+        Yield the text of each PDF page with pypdf (or PyPDF2)
+        
+        extract_text is pure Python and holds the GIL, so pages are extracted
+        in order; threads would only add contention.
+        """
+        with open(file_path, 'rb') as f:
+            reader = pypdf.PdfReader(f)
+            logger.info(f"PDF has {len(reader.pages)} pages")
+            for page in reader.pages:
+                yield page.extract_text() or ""
+    
+    def _image_chunks(self, file_path: Path, caption: Optional[str]) -> List[Dict[str, str]]:
+        """The single chunk of an image: its caption, or just the filename if captioning failed"""
+        text = f"[Image: {file_path.name}]\n{caption}" if caption is not None else f"[Image: {file_path.name}]"
+        return [{
+            'text': text,
+            'source': file_path.name,
+            'type': 'image'
+        }]
+    
+    def _prepare_image(self, file_path: Path) -> Optional[Tuple[str, str]]:
+        """
+        Read an image and base64-encode it for the vision model
+        
+        Returns:
+            Tuple of (base64-encoded image, MIME type), or None for an empty file
+        """
+        # Get image format
+        image_format = file_path.suffix.lower().replace('.', '')
+        if image_format == 'jpg':
+            image_format = 'jpeg'
+        mime_type = f"image/{image_format}"
+        
+        with open(file_path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            if file_size == 0:
+                logger.warning(f"Skipping empty image: {file_path.name}")
+                return None
             
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
+            # Large images are downscaled to what the vision model actually sees
+            # (only the header is read to get the size)
+            with Image.open(f) as image:
+                if max(image.size) > IMAGE_MAX_SIDE or file_size > IMAGE_PASSTHROUGH_MAX_BYTES:
+                    logger.info(f"Re-encoding {file_path.name} ({image.size[0]}x{image.size[1]}, {file_size} bytes)")
+                    # JPEGs are decoded straight at a reduced DCT scale (1/2 to 1/8) no
+                    # smaller than the target instead of at full size; no-op for other formats
+                    image.draft('RGB', (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+                    image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+                    buffer = BytesIO()
+                    image.convert('RGB').save(buffer, format='JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True)
+                    image_base64 = _b64encode(buffer.getbuffer())
+                    mime_type = "image/jpeg"
+                else:
+                    image_base64 = None
             
-            # Get image format
-            image_format = file_path.suffix.lower().replace('.', '')
-            if image_format == 'jpg':
-                image_format = 'jpeg'
+            if image_base64 is None:
+                # Small images are sent as-is; the encoder reads straight from
+                # the memory map instead of a heap copy of the file
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image_data:
+                    image_base64 = _b64encode(image_data)
+        
+        return image_base64, mime_type
+    
+    def _load_images(self, file_paths: List[Path]) -> Dict[Path, Tuple[List[Dict[str, str]], bool]]:
+        """Load and caption images on a private event loop (see _load_images_async)"""
+        if not file_paths:
+            return {}
+        return asyncio.run(self._load_images_async(file_paths))
+    
+    async def _load_images_async(self, file_paths: List[Path]) -> Dict[Path, Tuple[List[Dict[str, str]], bool]]:
+        """
+        Load and caption images concurrently
+        
+        All images are read and encoded on the default executor, then sent in
+        multi-image requests of IMAGE_CAPTION_BATCH_SIZE with the async client;
+        asyncio.gather keeps up to IMAGE_CAPTION_CONCURRENCY requests in flight
+        on this one thread instead of blocking a worker thread per request.
+        
+        Args:
+            file_paths: Image files to load
+        
+        Returns:
+            Chunks per image, and whether it was captioned (empty images are left out)
+        """
+        if not self.client:
+            for file_path in file_paths:
+                logger.warning(f"Cannot process image {file_path.name}: HF_TOKEN not set")
+            return {file_path: ([], False) for file_path in file_paths}
+        
+        loop = asyncio.get_running_loop()
+        
+        def prepare(file_path: Path) -> Optional[Tuple[str, str]]:
+            logger.info(f"Generating caption for image: {file_path.name}")
+            return self._prepare_image(file_path)
+        
+        results = {}
+        pending = []
+        loaded = await asyncio.gather(
+            *(loop.run_in_executor(None, prepare, file_path) for file_path in file_paths),
+            return_exceptions=True
+        )
+        for file_path, prepared in zip(file_paths, loaded):
+            if isinstance(prepared, BaseException):
+                logger.error(f"Error loading image {file_path.name}: {str(prepared)}", exc_info=prepared)
+                results[file_path] = ([], False)
+            elif prepared is not None:
+                pending.append((file_path, prepared))
+        
+        if pending:
+            # The async client is bound to this event loop, so it lives only as long as the run
+            async with AsyncOpenAI(base_url=self.client.base_url, api_key=self.client.api_key) as client:
+                semaphore = asyncio.Semaphore(IMAGE_CAPTION_CONCURRENCY)
+                batches = [
+                    pending[start:start + IMAGE_CAPTION_BATCH_SIZE]
+                    for start in range(0, len(pending), IMAGE_CAPTION_BATCH_SIZE)
+                ]
+                captions = await asyncio.gather(
+                    *(self._caption_images_async(client, semaphore, batch) for batch in batches)
+                )
             
-            # Generate caption using vision model
+            for (file_path, _), caption in zip(pending, (c for batch in captions for c in batch)):
+                if caption is not None:
+                    logger.info(f"Generated caption for {file_path.name}")
+                results[file_path] = (self._image_chunks(file_path, caption), caption is not None)
+        
+        for file_path in file_paths:
+            if file_path in results and results[file_path][0]:
+                logger.info(f"Successfully loaded {file_path.name} ({len(results[file_path][0])} chunks)")
+        return results
+    
+    async def _caption_images_async(
+        self,
+        client: AsyncOpenAI,
+        semaphore: asyncio.Semaphore,
+        batch: List[Tuple[Path, Tuple[str, str]]]
+    ) -> List[Optional[str]]:
+        """Caption a batch with one request, falling back to one request per image (None where that fails)"""
+        images = [prepared for _, prepared in batch]
+        if len(images) > 1:
             try:
-                completion = self.client.chat.completions.create(
-                    model=self.vision_model,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": "Describe this image in detail. Focus on any text, diagrams, charts, or important information visible in the image."
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/{image_format};base64,{image_base64}"
-                                    }
-                                }
-                            ]
-                        }
-                    ],
-                    max_tokens=500,
-                )
-                
-                caption = completion.choices[0].message.content
-                logger.info(f"Generated caption for {file_path.name}")
-                
-                return [{
-                    'text': f"[Image: {file_path.name}]\n{caption}",
-                    'source': file_path.name,
-                    'type': 'image'
-                }]
-                
+                async with semaphore:
+                    response = await self._vision_completion_async(client, self._batch_caption_content(images), 500 * len(images))
+                descriptions = self._parse_batch_captions(response, len(images))
+                logger.info(f"Captioned {len(images)} images with one batched request")
+                return descriptions
+            except Exception as e:
+                logger.warning(f"Batched captioning failed, captioning {len(images)} images one by one: {str(e)}")
+        
+        async def caption_one(file_path: Path, image_base64: str, mime_type: str) -> Optional[str]:
+            try:
+                async with semaphore:
+                    return await self._vision_completion_async(
+                        client,
+                        [{"type": "text", "text": IMAGE_PROMPT}, _image_content(image_base64, mime_type)],
+                        500
+                    )
             except Exception as e:
                 logger.error(f"Error generating caption for {file_path.name}: {str(e)}", exc_info=True)
-                # Fallback: just use filename
-                return [{
-                    'text': f"[Image: {file_path.name}]",
-                    'source': file_path.name,
-                    'type': 'image'
-                }]
-                
-        except Exception as e:
-            logger.error(f"Error loading image {file_path.name}: {str(e)}", exc_info=True)
-            return []
+                return None
+        
+        return await asyncio.gather(*(caption_one(file_path, *prepared) for file_path, prepared in batch))
     
     def _load_docx(self, file_path: Path) -> List[Dict[str, str]]:
         """Load and chunk a DOCX file"""
         try:
-            doc = docx.Document(file_path)
-            text = ""
-            
-            for para in doc.paragraphs:
-                text += para.text + "\n"
+            # One join instead of repeated += (which copies the growing string each time)
+            text = "\n".join(self._iter_docx_paragraphs(file_path))
             
             logger.info(f"Extracted text from DOCX: {len(text)} characters")
             chunks = self._chunk_text(text, file_path.name)
@@ -233,6 +929,39 @@ class DocumentLoader:
             logger.error(f"Error loading DOCX {file_path.name}: {str(e)}", exc_info=True)
             return []
     
+    def _iter_docx_paragraphs(self, file_path: Path) -> Iterator[str]:
+        """
+        Yield the text of each top-level paragraph of a DOCX file
+        
+        The document XML is streamed with lxml's iterparse rather than loaded
+        through python-docx, which builds an object per paragraph and run.
+        Like python-docx's Document.paragraphs, only paragraphs directly in the
+        body are included (not those inside tables). Each finished element is
+        cleared and detached, so memory stays flat on very long documents.
+        """
+        with zipfile.ZipFile(file_path) as package:
+            # The main part is nearly always word/document.xml, but the package
+            # relationships are authoritative
+            document_part = "word/document.xml"
+            relationships = etree.fromstring(package.read("_rels/.rels"))
+            for relationship in relationships:
+                if relationship.get("Type") == DOCX_OFFICE_DOCUMENT:
+                    document_part = relationship.get("Target").lstrip("/")
+                    break
+            
+            with package.open(document_part) as document_xml:
+                for _, element in etree.iterparse(
+                    document_xml, events=("end",), tag=(DOCX_PARAGRAPH, DOCX_TABLE), resolve_entities=False
+                ):
+                    parent = element.getparent()
+                    if parent is None or parent.tag != DOCX_BODY:
+                        continue
+                    if element.tag == DOCX_PARAGRAPH:
+                        yield _docx_paragraph_text(element)
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del parent[0]
+    
     def _chunk_text(self, text: str, source: str, chunk_size: int = 600, overlap: int = 100) -> List[Dict[str, str]]:
         """
         Split text into overlapping chunks
@@ -250,60 +979,76 @@ class DocumentLoader:
             logger.warning(f"Empty text from {source}")
             return []
         
-        chunks = []
+        chunks = [
+            {
+                'text': chunk_text,
+                'source': source,
+                'type': 'text'
+            }
+            for chunk_text in self._split_text(text, chunk_size, overlap)
+        ]
+        
+        logger.info(f"Created {len(chunks)} chunks from {source}")
+        return chunks
+    
+    def _split_text(self, text: str, chunk_size: int = 600, overlap: int = 100) -> Iterator[str]:
+        """
+        Yield overlapping chunks of text, breaking at sentence ends where possible
+        
+        Args:
+            text: Text to split
+            chunk_size: Target chunk size in characters (approximates tokens)
+            overlap: Overlap between chunks
+        """
         start = 0
         text_length = len(text)
         
+        sentence_ends = _sentence_ends(text)
+        
         while start < text_length:
             end = start + chunk_size
             
-            # Try to break at sentence boundary
+            # Try to break at the last sentence boundary inside the window. The
+            # boundary must lie past the overlap so the next chunk starts further on
             if end < text_length:
-                # Look for sentence endings
-                for sep in ['. ', '.\n', '! ', '?\n', '? ']:
-                    last_sep = text.rfind(sep, start, end)
-                    if last_sep != -1:
-                        end = last_sep + 1
-                        break
+                idx = bisect.bisect_right(sentence_ends, end) - 1
+                if idx >= 0 and sentence_ends[idx] > start + overlap:
+                    end = sentence_ends[idx]
             
             chunk_text = text[start:end].strip()
             
             if chunk_text:
-                chunks.append({
-                    'text': chunk_text,
-                    'source': source,
-                    'type': 'text'
-                })
+                yield chunk_text
             
+            if end >= text_length:
+                break
             start = end - overlap
-        
-        logger.info(f"Created {len(chunks)} chunks from {source}")
-        return chunks
     
-    def _load_video(self, file_path: Path) -> List[Dict[str, str]]:
+    def _load_video(self, file_path: Path) -> Tuple[List[Dict[str, str]], bool]:
         """
         Load and process a video file by:
         1. Extracting and transcribing audio
         2. Extracting key frames and generating visual descriptions
         3. Combining both into a comprehensive summary
+        
+        Returns:
+            Tuple of (list of chunks, whether every frame caption and the
+            transcription succeeded)
         """
         try:
             import cv2
-            import whisper
-            import tempfile
-            import numpy as np
             
             logger.info(f"Processing video: {file_path.name}")
             
             if not self.client:
                 logger.warning(f"Cannot process video {file_path.name}: HF_TOKEN not set")
-                return []
+                return [], False
             
             # Open video file
             video = cv2.VideoCapture(str(file_path))
             if not video.isOpened():
                 logger.error(f"Failed to open video: {file_path.name}")
-                return []
+                return [], False
             
             # Get video properties
             fps = video.get(cv2.CAP_PROP_FPS)
@@ -312,56 +1057,14 @@ class DocumentLoader:
             
             logger.info(f"Video duration: {duration:.2f}s, FPS: {fps:.2f}, Total frames: {frame_count_total}")
             
-            # PART 1: Audio Transcription
-            transcript_segments = []
-            try:
-                logger.info("Starting audio transcription...")
-                
-                # Load Whisper model (lazy loading)
-                if self.whisper_model is None:
-                    logger.info(f"Loading Whisper model: {self.whisper_model_name}")
-                    try:
-                        self.whisper_model = whisper.load_model(self.whisper_model_name)
-                        logger.info("Whisper model loaded successfully")
-                    except Exception as model_error:
-                        logger.error(f"Failed to load Whisper model: {str(model_error)}", exc_info=True)
-                        raise
-                
-                # Transcribe audio directly from video file
-                logger.info(f"Transcribing audio from {file_path.name} with Whisper...")
-                logger.info(f"Video file path: {str(file_path)}")
-                
-                result = self.whisper_model.transcribe(
-                    str(file_path),
-                    verbose=True,  # Enable verbose for debugging
-                    word_timestamps=False,
-                    fp16=False  # Disable FP16 for compatibility
-                )
-                
-                logger.info(f"Whisper transcription result keys: {result.keys()}")
-                logger.info(f"Detected language: {result.get('language', 'unknown')}")
-                
-                transcript_segments = result.get('segments', [])
-                full_text = result.get('text', '')
-                
-                logger.info(f"Transcription complete: {len(transcript_segments)} segments")
-                logger.info(f"Full transcript length: {len(full_text)} characters")
-                
-                # Log sample of transcript
-                if transcript_segments:
-                    sample_text = transcript_segments[0]['text'][:100]
-                    logger.info(f"Transcript sample: {sample_text}...")
-                elif full_text:
-                    logger.info(f"Full text sample: {full_text[:100]}...")
-                else:
-                    logger.warning("No transcript text found - video may not have audio")
-                
-            except Exception as e:
-                logger.error(f"Audio transcription failed: {str(e)}", exc_info=True)
-                logger.info("Continuing with video-only processing")
+            # PART 1: Audio Transcription, in the background while frames are analyzed
+            transcription_executor = ThreadPoolExecutor(max_workers=1)
+            transcript_future = transcription_executor.submit(self._transcribe_video, file_path)
+            transcription_executor.shutdown(wait=False)
             
             # PART 2: Visual Frame Analysis
             frame_descriptions = []
+            failed_frames = 0
             
             # Calculate frame extraction parameters
             frame_interval_frames = int(fps * self.video_frame_interval)
@@ -376,63 +1079,96 @@ class DocumentLoader:
             
             logger.info(f"Extracting {total_frames_to_extract} frames at {frame_interval_frames} frame intervals")
             
+            # Frames are captioned while the rest of the video is still being decoded:
+            # each encoded frame is handed to the request pool as soon as it is read.
+            # Frames that look like the last captioned one are not sent; they are
+            # mapped to that frame's timestamp and reuse its description
+            duplicate_frames = []
+            last_hash = None
+            last_captioned_timestamp = None
+            frame_interval_frames = max(1, frame_interval_frames)
             frame_num = 0
             extracted_count = 0
             
-            while extracted_count < total_frames_to_extract:
-                # Set video position
-                video.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-                ret, frame = video.read()
-                
-                if not ret:
-                    break
-                
-                timestamp = frame_num / fps
-                logger.info(f"Frame {extracted_count + 1}/{total_frames_to_extract}: Analyzing frame at {timestamp:.2f}s")
+            logger.info(f"Captioning frames with up to {self.caption_workers} concurrent requests")
+            with ThreadPoolExecutor(max_workers=self.caption_workers) as executor:
+                futures = {}
                 
-                try:
-                    # Convert frame to JPEG
-                    _, buffer = cv2.imencode('.jpg', frame)
-                    frame_base64 = base64.b64encode(buffer).decode('utf-8')
+                while extracted_count < total_frames_to_extract:
+                    ret, frame = video.read()
                     
-                    # Analyze frame with vision model
-                    completion = self.client.chat.completions.create(
-                        model=self.vision_model,
-                        messages=[
-                            {
-                                "role": "user",
-                                "content": [
-                                    {
-                                        "type": "text",
-                                        "text": "Describe what is shown in this video frame. Focus on key visual elements, actions, text, or important information."
-                                    },
-                                    {
-                                        "type": "image_url",
-                                        "image_url": {
-                                            "url": f"data:image/jpeg;base64,{frame_base64}"
-                                        }
-                                    }
-                                ]
-                            }
-                        ],
-                        max_tokens=300,
-                    )
+                    if not ret:
+                        break
                     
-                    description = completion.choices[0].message.content
-                    frame_descriptions.append({
-                        'timestamp': timestamp,
-                        'description': description
-                    })
+                    timestamp = frame_num / fps
+                    
+                    # Downscale before encoding; INTER_AREA avoids aliasing when shrinking
+                    height, width = frame.shape[:2]
+                    scale = VIDEO_FRAME_MAX_SIDE / max(height, width)
+                    if scale < 1:
+                        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
                     
-                    logger.info(f"Frame {extracted_count + 1} analyzed successfully")
+                    frame_hash = _dhash(frame)
+                    if last_hash is not None and bin(frame_hash ^ last_hash).count('1') <= VIDEO_FRAME_DEDUP_DISTANCE:
+                        duplicate_frames.append((timestamp, last_captioned_timestamp))
+                    else:
+                        # Convert frame to JPEG; the encoded numpy buffer is base64-encoded
+                        # in place without an intermediate bytes copy
+                        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, VIDEO_FRAME_JPEG_QUALITY])
+                        if ok:
+                            futures[executor.submit(self._caption_frame, _b64encode(buffer))] = timestamp
+                            last_hash = frame_hash
+                            last_captioned_timestamp = timestamp
+                        else:
+                            logger.warning(f"Could not encode frame at {timestamp:.2f}s")
+                    
+                    extracted_count += 1
+                    if extracted_count >= total_frames_to_extract:
+                        break
                     
-                except Exception as e:
-                    logger.error(f"Error analyzing frame at {timestamp:.2f}s: {str(e)}")
+                    frame_num += frame_interval_frames
+                    if frame_interval_frames <= VIDEO_MAX_GRAB_GAP:
+                        # Short gap: step forward with grab() (decode only, no copy) rather
+                        # than seeking, which re-decodes from the previous keyframe
+                        for _ in range(frame_interval_frames - 1):
+                            if not video.grab():
+                                break
+                    else:
+                        # Long gap: a keyframe seek decodes fewer frames than grabbing through
+                        video.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
                 
-                extracted_count += 1
-                frame_num += frame_interval_frames
+                video.release()
+                logger.info(
+                    f"Decoded {extracted_count} frames: {len(futures)} sent for captioning, "
+                    f"{len(duplicate_frames)} near-duplicates skipped"
+                )
+                
+                for future in as_completed(futures):
+                    timestamp = futures[future]
+                    try:
+                        frame_descriptions.append({
+                            'timestamp': timestamp,
+                            'description': future.result()
+                        })
+                        logger.info(f"Frame at {timestamp:.2f}s analyzed successfully")
+                    except Exception as e:
+                        failed_frames += 1
+                        logger.error(f"Error analyzing frame at {timestamp:.2f}s: {str(e)}")
+            
+            descriptions_by_timestamp = {fd['timestamp']: fd['description'] for fd in frame_descriptions}
+            for timestamp, captioned_timestamp in duplicate_frames:
+                if captioned_timestamp in descriptions_by_timestamp:
+                    frame_descriptions.append({
+                        'timestamp': timestamp,
+                        'description': descriptions_by_timestamp[captioned_timestamp]
+                    })
+            
+            frame_descriptions.sort(key=lambda fd: fd['timestamp'])
+            
+            transcript_segments = transcript_future.result()
+            complete = failed_frames == 0 and transcript_segments is not None
+            transcript_segments = transcript_segments or []
             
-            video.release()
             logger.info(f"Frame extraction complete: {len(frame_descriptions)} frames analyzed")
             
             # PART 3: Combine Visual and Audio Data
@@ -445,23 +1181,26 @@ class DocumentLoader:
             chunk_duration = 30  # seconds per chunk
             num_chunks = max(1, int(duration / chunk_duration) + 1)
             
+            # Bucket frames and transcript segments by time range in one pass each
+            frame_buckets = [[] for _ in range(num_chunks)]
+            for fd in frame_descriptions:
+                if 0 <= fd['timestamp'] < duration:
+                    frame_buckets[int(fd['timestamp'] // chunk_duration)].append(
+                        f"[{fd['timestamp']:.1f}s] {fd['description']}"
+                    )
+            
+            transcript_buckets = [[] for _ in range(num_chunks)]
+            for seg in transcript_segments:
+                if 0 <= seg['start'] < duration:
+                    transcript_buckets[int(seg['start'] // chunk_duration)].append(
+                        f"[{seg['start']:.1f}s] {seg['text']}"
+                    )
+            
             for i in range(num_chunks):
                 chunk_start = i * chunk_duration
                 chunk_end = min((i + 1) * chunk_duration, duration)
-                
-                # Gather frames in this time range
-                chunk_frames = [
-                    f"[{fd['timestamp']:.1f}s] {fd['description']}"
-                    for fd in frame_descriptions
-                    if chunk_start <= fd['timestamp'] < chunk_end
-                ]
-                
-                # Gather transcript segments in this time range
-                chunk_transcript = [
-                    f"[{seg['start']:.1f}s] {seg['text']}"
-                    for seg in transcript_segments
-                    if chunk_start <= seg['start'] < chunk_end
-                ]
+                chunk_frames = frame_buckets[i]
+                chunk_transcript = transcript_buckets[i]
                 
                 # Only create chunk if there's content
                 if chunk_frames or chunk_transcript:
@@ -486,14 +1225,183 @@ class DocumentLoader:
             logger.info(f"Successfully processed video with {len(chunks)} chunks")
             logger.info(f"  - Visual frames: {len(frame_descriptions)}")
             logger.info(f"  - Audio segments: {len(transcript_segments)}")
+            if not complete:
+                logger.warning(f"{file_path.name} is missing {failed_frames} frame captions or its transcript")
             
-            return chunks
+            return chunks, complete
             
         except ImportError as e:
             logger.error(f"Missing required library for video processing: {str(e)}")
-            logger.error("Please install: pip install opencv-python openai-whisper")
-            return []
+            logger.error("Please install: pip install opencv-python faster-whisper")
+            return [], False
         except Exception as e:
             logger.error(f"Error loading video {file_path.name}: {str(e)}", exc_info=True)
-            return []
+            return [], False
 
+    def _transcribe_video(self, file_path: Path) -> Optional[List[Dict[str, Any]]]:
+        """
+        Transcribe the audio track of a video
+        
+        Returns:
+            Whisper segments (dicts with 'start', 'end' and 'text'), an empty list
+            for a video without an audio track, or None if transcription fails
+        """
+        transcript_segments = []
+        try:
+            logger.info("Starting audio transcription...")
+            
+            # A silent video has a complete (empty) transcript; ffmpeg would fail on it
+            if shutil.which('ffprobe') and not _has_audio_stream(file_path):
+                logger.info(f"{file_path.name} has no audio track, skipping transcription")
+                return []
+            
+            # Decode the audio track in memory when ffmpeg is available; otherwise
+            # the backend reads the file itself
+            audio = str(file_path)
+            if shutil.which('ffmpeg'):
+                audio = _decode_audio(file_path)
+                logger.info(f"Decoded {len(audio) / 16000:.1f}s of audio from {file_path.name}")
+            
+            # Videos load on a thread pool; the shared model is loaded once and
+            # runs one transcription at a time (openai-whisper's decoder isn't reentrant)
+            with _whisper_lock:
+                # Load Whisper model (lazy loading, shared by every video in this process)
+                try:
+                    whisper_backend, whisper_model = _get_whisper_model(self.whisper_model_name)
+                except Exception as model_error:
+                    logger.error(f"Failed to load Whisper model: {str(model_error)}", exc_info=True)
+                    raise
+            
+                logger.info(f"Transcribing audio from {file_path.name} with {whisper_backend}...")
+                logger.info(f"Video file path: {str(file_path)}")
+                
+                result = _transcribe(whisper_backend, whisper_model, audio)
+            
+            logger.info(f"Whisper transcription result keys: {result.keys()}")
+            logger.info(f"Detected language: {result.get('language', 'unknown')}")
+            
+            transcript_segments = result.get('segments', [])
+            full_text = result.get('text', '')
+            
+            logger.info(f"Transcription complete: {len(transcript_segments)} segments")
+            logger.info(f"Full transcript length: {len(full_text)} characters")
+            
+            # Log sample of transcript
+            if transcript_segments:
+                sample_text = transcript_segments[0]['text'][:100]
+                logger.info(f"Transcript sample: {sample_text}...")
+            elif full_text:
+                logger.info(f"Full text sample: {full_text[:100]}...")
+            else:
+                logger.warning("No transcript text found - video may not have audio")
+        
+        except Exception as e:
+            logger.error(f"Audio transcription failed: {str(e)}", exc_info=True)
+            logger.info("Continuing with video-only processing")
+            return None
+        
+        return transcript_segments
+    
+    def _caption_frame(self, frame_base64: str) -> str:
+        """Describe a single base64-encoded JPEG video frame with the vision model"""
+        return self._describe_image(
+            frame_base64,
+            "image/jpeg",
+            "Describe what is shown in this video frame. Focus on key visual elements, actions, text, or important information.",
+            max_tokens=300
+        )
+    
+    def _describe_image(self, image_base64: str, mime_type: str, prompt: str, max_tokens: int) -> str:
+        """
+        Send one base64-encoded image and a prompt to the vision model
+        
+        The HuggingFace router only takes images as image_url content parts
+        (a data: URL or a public http(s) URL); it has no multipart upload or
+        file-id reference, so the image travels inline as a data: URL. When
+        orjson is installed (and the openai SDK accepts raw content) the request
+        body is serialized with it and posted as is, bypassing the SDK's stdlib
+        json encoding.
+        
+        Args:
+            image_base64: Base64-encoded image bytes
+            mime_type: Image MIME type, e.g. "image/jpeg"
+            prompt: Instruction sent alongside the image
+            max_tokens: Maximum tokens in the description
+        
+        Returns:
+            The model's description of the image
+        """
+        return self._vision_completion(
+            [
+                {
+                    "type": "text",
+                    "text": prompt
+                },
+                _image_content(image_base64, mime_type)
+            ],
+            max_tokens
+        )
+    
+    def _batch_caption_content(self, images: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Message content asking for one labelled description per image"""
+        content = [{"type": "text", "text": IMAGE_BATCH_PROMPT.format(count=len(images))}]
+        for i, (image_base64, mime_type) in enumerate(images, start=1):
+            content.append({"type": "text", "text": f"IMG_{i}:"})
+            content.append(_image_content(image_base64, mime_type))
+        return content
+        
+    def _parse_batch_captions(self, response: Optional[str], count: int) -> List[str]:
+        """
+        Split a batched caption response into per-image descriptions
+        
+        Raises:
+            ValueError: If the response doesn't contain a description for every label
+        """
+        # re.split with a capture group yields [preamble, label, text, label, text, ...]
+        parts = IMAGE_LABEL_PATTERN.split(response or "")
+        descriptions = {}
+        for label, text in zip(parts[1::2], parts[2::2]):
+            descriptions.setdefault(int(label), text.strip())
+        
+        if not all(descriptions.get(i) for i in range(1, count + 1)):
+            raise ValueError(f"Batched caption response is missing descriptions for some of {count} images")
+        return [descriptions[i] for i in range(1, count + 1)]
+    
+    def _vision_request(self, content: List[Dict[str, Any]], max_tokens: int) -> Dict[str, Any]:
+        """Chat completion request with one user message (text and image parts)"""
+        return {
+            "model": self.vision_model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ],
+            "max_tokens": max_tokens,
+        }
+        
+    def _vision_completion(self, content: List[Dict[str, Any]], max_tokens: int) -> str:
+        """Send one user message (text and image parts) to the vision model and return its reply"""
+        request = self._vision_request(content, max_tokens)
+        if not ORJSON_REQUESTS:
+            completion = self.client.chat.completions.create(**request)
+        else:
+            completion = self.client.post(
+                "/chat/completions",
+                content=orjson.dumps(request),
+                cast_to=ChatCompletion
+            )
+        return completion.choices[0].message.content
+
+    async def _vision_completion_async(self, client: AsyncOpenAI, content: List[Dict[str, Any]], max_tokens: int) -> str:
+        """Async counterpart of _vision_completion, sent with the given AsyncOpenAI client"""
+        request = self._vision_request(content, max_tokens)
+        if not ORJSON_REQUESTS:
+            completion = await client.chat.completions.create(**request)
+        else:
+            completion = await client.post(
+                "/chat/completions",
+                content=orjson.dumps(request),
+                cast_to=ChatCompletion
+            )
+        return completion.choices[0].message.content
@@ -1,19 +1,94 @@
 import os
+import asyncio
 import logging
+import threading
+from functools import partial
 from datetime import datetime
-from typing import List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-from openai import OpenAI
+import numpy as np
+from openai import OpenAI, AsyncOpenAI
 from loader import DocumentLoader
 from vector_store import VectorStore
 from embeddings import EmbeddingModel
+from cache import AnswerCache, EmbeddingCache
 
 logger = logging.getLogger(__name__)
 
+# Folder holding the saved FAISS index and its document chunks
+INDEX_DIR = os.path.join("cache", "index")
+
+SYSTEM_PROMPT = """You are a helpful AI assistant for onboarding new employees. 
+Your role is to answer questions based on the provided onboarding documentation.
+Be friendly, clear, and concise. If the context doesn't contain enough information 
+to answer the question, say so politely."""
+
+class _QueryEmbeddingBatcher:
+    """Coalesces query embeddings requested while the encoder is busy into one embed_queries call"""
+    
+    def __init__(self, embedding_model: EmbeddingModel, max_batch_size: int = 64):
+        """
+        Args:
+            embedding_model: Embedding model instance
+            max_batch_size: Most queries encoded in one call
+        """
+        self.embedding_model = embedding_model
+        self.max_batch_size = max_batch_size
+        self._pending = []
+        self._encoding = False
+        self._tasks = set()
+    
+    async def embed(self, text: str) -> np.ndarray:
+        """
+        Embed a text, waiting for its vector
+        
+        Texts in the embedding model's query cache are answered at once. Otherwise
+        an idle encoder starts on the text right away, and texts that arrive
+        while it is busy are encoded together as soon as it finishes.
+        """
+        embedding = self.embedding_model.get_cached_embedding(text)
+        if embedding is not None:
+            return embedding
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        if not self._encoding:
+            self._flush()
+        return await future
+    
+    def _flush(self):
+        """Hand up to max_batch_size pending texts to a single encoding task"""
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        self._encoding = True
+        task = asyncio.get_running_loop().create_task(self._encode(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _encode(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Encode a batch off the event loop, resolve the waiting futures, then start on the next batch"""
+        texts = [text for text, _ in batch]
+        try:
+            loop = asyncio.get_running_loop()
+            embeddings = await loop.run_in_executor(None, self.embedding_model.embed_queries, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            logger.debug(f"Embedded {len(texts)} coalesced queries")
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        finally:
+            self._encoding = False
+            if self._pending:
+                self._flush()
+
 class RAGSystem:
     """Main RAG system orchestrating document loading, embedding, and querying"""
     
@@ -22,9 +97,16 @@ class RAGSystem:
         self.docs_folder = "docs"
         self.loader = DocumentLoader(self.docs_folder)
         self.embedding_model = EmbeddingModel()
-        self.vector_store = VectorStore(self.embedding_model)
+        self.embedding_cache = EmbeddingCache()
+        self.vector_store = VectorStore(self.embedding_model, embedding_cache=self.embedding_cache)
         self.vector_store_ready = False
         self.last_index_time = None
+        self.loaded_files = []
+        
+        # Guards swapping in a newly built vector store; queries only hold it to
+        # take a reference, so a background rebuild never blocks them
+        self._lock = threading.RLock()
+        self._rebuild_thread = None
         
         # Initialize OpenAI client for HuggingFace
         hf_token = os.environ.get("HF_TOKEN")
@@ -36,39 +118,130 @@ class RAGSystem:
             base_url="https://router.huggingface.co/v1",
             api_key=hf_token,
         )
+        self.async_client = AsyncOpenAI(
+            base_url="https://router.huggingface.co/v1",
+            api_key=hf_token,
+        )
         self.model = "Qwen/Qwen2.5-VL-7B-Instruct:hyperbolic"
         logger.info(f"OpenAI client configured with model: {self.model}")
+        
+        # Repeated questions over the same retrieved context skip the API call
+        self.answer_cache = AnswerCache()
+        
+        # Event loop for concurrent queries, started on first use
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self._query_batcher = _QueryEmbeddingBatcher(self.embedding_model)
     
-    def initialize(self):
-        """Initialize the RAG system by loading documents and building vector store"""
+    def initialize(self, force_rebuild: bool = False):
+        """
+        Initialize the RAG system by loading documents and building vector store
+        
+        The index saved by the previous build is reused while no document has
+        been added, removed or modified since, skipping loading and embedding.
+        The new index is built into a separate vector store and swapped in once
+        complete, so the current one keeps serving queries until then (and stays
+        in place if the build fails).
+        
+        Args:
+            force_rebuild: Always load and index the documents, ignoring a saved index
+        """
         logger.info("Starting RAG system initialization...")
         try:
+            vector_store = VectorStore(self.embedding_model, embedding_cache=self.embedding_cache)
+            fingerprint = self.loader.corpus_fingerprint()
+            if not force_rebuild:
+                metadata = vector_store.load(INDEX_DIR, fingerprint)
+                if metadata is not None:
+                    indexed_at = metadata.get('indexed_at')
+                    self._swap_vector_store(
+                        vector_store,
+                        metadata.get('loaded_files', []),
+                        datetime.fromisoformat(indexed_at) if indexed_at else datetime.now()
+                    )
+                    logger.info("Using saved vector store, documents are unchanged")
+                    return
+            
             # Load all documents
             logger.info(f"Loading documents from {self.docs_folder}...")
             documents = self.loader.load_all_documents()
+            loaded_files = list(self.loader.loaded_files)
+            incomplete_files = list(self.loader.incomplete_files)
             logger.info(f"Loaded {len(documents)} document chunks")
             
             if documents:
                 # Build vector store
                 logger.info("Building vector store...")
-                self.vector_store.build_index(documents)
-                self.vector_store_ready = True
-                self.last_index_time = datetime.now()
+                vector_store.build_index(documents)
+                index_time = datetime.now()
+                self._swap_vector_store(vector_store, loaded_files, index_time)
                 logger.info("Vector store built successfully")
+                
+                # A degraded index (failed captions, no HF_TOKEN) isn't saved, so the
+                # next start loads the documents again instead of reusing it
+                if incomplete_files:
+                    logger.warning(
+                        f"Not saving the vector store: {len(incomplete_files)} files loaded incompletely "
+                        f"({', '.join(incomplete_files[:5])})"
+                    )
+                else:
+                    try:
+                        vector_store.save(INDEX_DIR, fingerprint, {
+                            'loaded_files': loaded_files,
+                            'indexed_at': index_time.isoformat(),
+                        })
+                    except Exception as e:
+                        logger.warning(f"Could not save vector store: {str(e)}")
             else:
                 logger.warning("No documents found to index")
-                self.vector_store_ready = False
+                self._swap_vector_store(vector_store, loaded_files, None)
                 
         except Exception as e:
             logger.error(f"Error during initialization: {str(e)}", exc_info=True)
-            self.vector_store_ready = False
             raise
     
-    def rebuild_vector_store(self):
-        """Rebuild the vector store from scratch"""
-        logger.info("Rebuilding vector store...")
-        self.vector_store_ready = False
-        self.initialize()
+    def _swap_vector_store(self, vector_store: VectorStore, loaded_files: List[str], index_time: Optional[datetime]):
+        """Atomically replace the vector store and its document list (ready only if it holds vectors)"""
+        with self._lock:
+            self.vector_store = vector_store
+            self.vector_store_ready = vector_store.get_index_size() > 0
+            self.loaded_files = loaded_files
+            self.last_index_time = index_time
+    
+    def _current_vector_store(self) -> Optional[VectorStore]:
+        """Reference to the vector store queries should use, or None if none is ready"""
+        with self._lock:
+            return self.vector_store if self.vector_store_ready else None
+    
+    def rebuild_vector_store(self) -> bool:
+        """
+        Rebuild the vector store from scratch in a background thread
+        
+        Queries keep using the current index until the new one is built and
+        swapped in; if the rebuild fails, the current index stays in place.
+        
+        Returns:
+            True if a rebuild was started, False if one is already running
+        """
+        with self._lock:
+            if self.is_rebuilding():
+                logger.info("Vector store rebuild already in progress")
+                return False
+            logger.info("Rebuilding vector store in the background...")
+            self._rebuild_thread = threading.Thread(target=self._rebuild_worker, name="rag-rebuild", daemon=True)
+            self._rebuild_thread.start()
+        return True
+    
+    def _rebuild_worker(self):
+        """Body of the background rebuild thread"""
+        try:
+            self.initialize(force_rebuild=True)
+        except Exception as e:
+            logger.error(f"Background rebuild failed, keeping the current index: {str(e)}", exc_info=True)
+    
+    def is_rebuilding(self) -> bool:
+        """Whether a background rebuild is running"""
+        return self._rebuild_thread is not None and self._rebuild_thread.is_alive()
     
     def query(self, question: str, top_k: int = 5) -> Tuple[str, List[str]]:
         """
@@ -81,64 +254,44 @@ class RAGSystem:
         Returns:
             Tuple of (answer, list of source documents)
         """
-        logger.info(f"Processing query: {question[:100]}...")
+        logger.debug(f"Processing query: {question[:100]}...")
         
-        if not self.vector_store_ready:
+        vector_store = self._current_vector_store()
+        if vector_store is None:
             logger.warning("Vector store not ready, returning error message")
             return "The system is not ready yet. Please wait for documents to be indexed.", []
         
         try:
             # Retrieve relevant documents
-            logger.info(f"Retrieving top {top_k} relevant documents...")
-            retrieved_docs = self.vector_store.search(question, top_k=top_k)
-            logger.info(f"Retrieved {len(retrieved_docs)} documents")
+            logger.debug(f"Retrieving top {top_k} relevant documents...")
+            retrieved_docs = vector_store.search(question, top_k=top_k)
+            logger.debug(f"Retrieved {len(retrieved_docs)} documents")
             
             if not retrieved_docs:
                 logger.warning("No relevant documents found")
                 return "I couldn't find any relevant information to answer your question.", []
             
-            # Extract context and sources
-            context_parts = []
-            sources = []
-            
-            for doc in retrieved_docs:
-                context_parts.append(doc['text'])
-                source = doc.get('source', 'Unknown')
-                if source not in sources:
-                    sources.append(source)
-            
-            context = "\n\n".join(context_parts)
-            logger.info(f"Context prepared from {len(sources)} unique sources")
+            messages, sources = self._build_messages(question, retrieved_docs)
             
-            # Build prompt
-            system_prompt = """You are a helpful AI assistant for onboarding new employees. 
-Your role is to answer questions based on the provided onboarding documentation.
-Be friendly, clear, and concise. If the context doesn't contain enough information 
-to answer the question, say so politely."""
-
-            user_prompt = f"""Based on the following context from onboarding documents, please answer the question.
-
-Context:
-{context}
-
-Question: {question}
-
-Answer:"""
+            cache_key = self.answer_cache.key(self.model, question, retrieved_docs)
+            cached_answer = self.answer_cache.get(cache_key)
+            if cached_answer is not None:
+                logger.debug("Answer served from cache")
+                return cached_answer, sources
             
             # Call HuggingFace API
-            logger.info("Calling HuggingFace API...")
+            logger.debug("Calling HuggingFace API...")
             completion = self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=messages,
                 max_tokens=1000,
                 temperature=0.7,
             )
             
             answer = completion.choices[0].message.content
-            logger.info("Response generated successfully")
+            logger.debug("Response generated successfully")
+            if answer:
+                self.answer_cache.set(cache_key, answer)
             
             return answer, sources
             
@@ -146,10 +299,202 @@ Answer:"""
             logger.error(f"Error during query: {str(e)}", exc_info=True)
             return f"An error occurred while processing your question: {str(e)}", []
     
+    def query_stream(self, question: str, top_k: int = 5) -> Tuple[Iterator[str], List[str]]:
+        """
+        Query the RAG system and stream the answer token by token
+        
+        Retrieval happens up front; the returned iterator then yields answer
+        chunks as the model generates them.
+        
+        Args:
+            question: User's question
+            top_k: Number of top documents to retrieve
+        
+        Returns:
+            Tuple of (iterator over answer chunks, list of source documents)
+        """
+        logger.debug(f"Processing streaming query: {question[:100]}...")
+        
+        vector_store = self._current_vector_store()
+        if vector_store is None:
+            logger.warning("Vector store not ready, returning error message")
+            return iter(["The system is not ready yet. Please wait for documents to be indexed."]), []
+        
+        try:
+            # Embed through the shared batcher so concurrent sessions still coalesce
+            retrieved_docs = asyncio.run_coroutine_threadsafe(
+                self._retrieve(vector_store, question, top_k), self._get_event_loop()
+            ).result()
+            logger.debug(f"Retrieved {len(retrieved_docs)} documents")
+            
+            if not retrieved_docs:
+                logger.warning("No relevant documents found")
+                return iter(["I couldn't find any relevant information to answer your question."]), []
+            
+            messages, sources = self._build_messages(question, retrieved_docs)
+        
+            cache_key = self.answer_cache.key(self.model, question, retrieved_docs)
+            cached_answer = self.answer_cache.get(cache_key)
+            if cached_answer is not None:
+                logger.debug("Answer served from cache")
+                return iter([cached_answer]), sources
+        
+        except Exception as e:
+            logger.error(f"Error during query: {str(e)}", exc_info=True)
+            return iter([f"An error occurred while processing your question: {str(e)}"]), []
+        
+        return self._stream_completion(messages, cache_key), sources
+    
+    def _stream_completion(self, messages: List[Dict[str, str]], cache_key: str) -> Iterator[str]:
+        """Yield answer chunks from a streaming chat completion, caching the answer once it is complete"""
+        try:
+            logger.debug("Calling HuggingFace API (streaming)...")
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=1000,
+                temperature=0.7,
+                stream=True,
+            )
+            
+            parts = []
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+            
+            logger.debug("Response streamed successfully")
+            if parts:
+                self.answer_cache.set(cache_key, "".join(parts))
+        
+        except Exception as e:
+            logger.error(f"Error during streaming: {str(e)}", exc_info=True)
+            yield f"An error occurred while processing your question: {str(e)}"
+    
+    async def aquery(self, question: str, top_k: int = 5) -> Tuple[str, List[str]]:
+        """
+        Query the RAG system asynchronously
+        
+        Repeated questions are answered from the search and query embedding
+        caches; other query embeddings from concurrent callers are coalesced into
+        one encoder call, and the chat completion uses the async client so
+        requests overlap.
+        
+        Args:
+            question: User's question
+            top_k: Number of top documents to retrieve
+        
+        Returns:
+            Tuple of (answer, list of source documents)
+        """
+        logger.debug(f"Processing async query: {question[:100]}...")
+        
+        vector_store = self._current_vector_store()
+        if vector_store is None:
+            logger.warning("Vector store not ready, returning error message")
+            return "The system is not ready yet. Please wait for documents to be indexed.", []
+        
+        try:
+            retrieved_docs = await self._retrieve(vector_store, question, top_k)
+            logger.debug(f"Retrieved {len(retrieved_docs)} documents")
+            
+            if not retrieved_docs:
+                logger.warning("No relevant documents found")
+                return "I couldn't find any relevant information to answer your question.", []
+            
+            messages, sources = self._build_messages(question, retrieved_docs)
+            
+            cache_key = self.answer_cache.key(self.model, question, retrieved_docs)
+            cached_answer = self.answer_cache.get(cache_key)
+            if cached_answer is not None:
+                logger.debug("Answer served from cache")
+                return cached_answer, sources
+            
+            logger.debug("Calling HuggingFace API (async)...")
+            completion = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=1000,
+                temperature=0.7,
+            )
+            
+            answer = completion.choices[0].message.content
+            logger.debug("Response generated successfully")
+            if answer:
+                self.answer_cache.set(cache_key, answer)
+            
+            return answer, sources
+        
+        except Exception as e:
+            logger.error(f"Error during async query: {str(e)}", exc_info=True)
+            return f"An error occurred while processing your question: {str(e)}", []
+    
+    async def _retrieve(self, vector_store: VectorStore, question: str, top_k: int) -> List[Dict[str, str]]:
+        """
+        Retrieve the chunks for a question on the shared event loop
+        
+        A question searched before (since the index was built) is answered from
+        the vector store's search cache; otherwise it is embedded through the
+        query batcher and its results are cached. The FAISS search runs on the
+        default executor, so concurrent queries don't wait on each other's
+        searches on the event loop thread.
+        """
+        retrieved_docs = vector_store.get_cached_results(question, top_k)
+        if retrieved_docs is None:
+            query_embedding = await self._query_batcher.embed(question)
+            retrieved_docs = await asyncio.get_running_loop().run_in_executor(
+                None, partial(vector_store.search_by_embedding, query_embedding, top_k=top_k, query=question)
+            )
+        return retrieved_docs
+    
+    def _get_event_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the background event loop thread on first use"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="rag-event-loop", daemon=True).start()
+                logger.info("Background event loop started for async queries")
+            return self._loop
+    
+    def _build_messages(self, question: str, retrieved_docs: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], List[str]]:
+        """
+        Build the chat messages for a question and its retrieved context
+        
+        Returns:
+            Tuple of (chat messages, list of unique source documents)
+        """
+        # Extract context and sources
+        context_parts = []
+        sources = []
+        
+        for doc in retrieved_docs:
+            context_parts.append(doc['text'])
+            source = doc.get('source', 'Unknown')
+            if source not in sources:
+                sources.append(source)
+        
+        context = "\n\n".join(context_parts)
+        logger.debug(f"Context prepared from {len(sources)} unique sources")
+        
+        user_prompt = f"""Based on the following context from onboarding documents, please answer the question.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer:"""
+
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
+        return messages, sources
+    
     def get_document_count(self) -> int:
         """Get the number of loaded documents"""
-        return len(self.loader.loaded_files)
+        return len(self.loaded_files)
     
     def get_loaded_documents(self) -> List[str]:
         """Get list of loaded document names"""
-        return sorted(self.loader.loaded_files)
+        return sorted(self.loaded_files)
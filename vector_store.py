@@ -1,34 +1,123 @@
+import os
+import json
 import logging
 import numpy as np
 import faiss
-from typing import List, Dict
+from typing import Any, Iterable, List, Dict, Optional
 from embeddings import EmbeddingModel
+from cache import EmbeddingCache, LRUCache
 
 logger = logging.getLogger(__name__)
 
+# Corpus sizes at which exact flat search gives way to approximate indexes:
+# HNSW graph search from 10k vectors, IVF-PQ (compressed codes) from 1M
+HNSW_MIN_VECTORS = 10_000
+IVFPQ_MIN_VECTORS = 1_000_000
+
+# HNSW graph degree and candidate list sizes while building and searching
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Chunks embedded per group while building the index
+EMBED_GROUP_SIZE = 256
+
+# IVF-PQ inverted lists, lists probed per query, and bits per PQ sub-code
+IVFPQ_NLIST = 1024
+IVFPQ_NPROBE = 16
+IVFPQ_NBITS = 8
+
+# Scalar quantizer codec per quantization option: half precision, or one byte per
+# dimension (a quarter of float32; a per-dimension range is learned when training)
+SCALAR_QUANTIZER_TYPES = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
 class VectorStore:
     """FAISS-based vector store for document retrieval"""
     
-    def __init__(self, embedding_model: EmbeddingModel):
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel,
+        quantization: Optional[str] = None,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        search_cache_size: int = 256
+    ):
         """
         Initialize vector store
         
         Args:
             embedding_model: Embedding model instance
+            quantization: None to store float32 vectors, "fp16" to store them as half
+                precision (halves index memory and bandwidth during search), or "int8"
+                to store 8-bit codes (a quarter of the memory, usually <1% recall loss)
+            embedding_cache: Optional persistent cache, so unchanged chunks aren't
+                re-embedded when the index is rebuilt
+            search_cache_size: Number of (query, top_k) results kept in the search LRU cache
         """
+        if quantization is not None and quantization not in SCALAR_QUANTIZER_TYPES:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        
         self.embedding_model = embedding_model
+        self.quantization = quantization
+        self.embedding_cache = embedding_cache
         self.index = None
         self.documents = []
         self.dimension = embedding_model.embedding_dim
+        # Bound to this instance and cleared whenever the index is rebuilt
+        self._search_cache = LRUCache(search_cache_size)
         logger.info(f"Vector store initialized with dimension: {self.dimension}")
     
-    def build_index(self, documents: List[Dict[str, str]]):
+    def _create_index(self, num_vectors: int) -> faiss.Index:
+        """
+        Create an empty FAISS index suited to the corpus size and storage precision
+        
+        Small corpora use exact flat search. Larger ones use an HNSW graph
+        (sub-linear search), and very large ones IVF-PQ, which also compresses
+        each vector to a few bytes (so the quantization option doesn't apply there).
+        All of them rank by inner product, which on the L2-normalized vectors
+        stored here is cosine similarity.
+        
+        Args:
+            num_vectors: Number of vectors that will be added
+        """
+        if num_vectors >= IVFPQ_MIN_VECTORS:
+            # Each PQ sub-quantizer encodes an equal slice of the vector
+            m = next(m for m in (16, 8, 4, 2, 1) if self.dimension % m == 0)
+            quantizer = faiss.IndexFlatIP(self.dimension)
+            index = faiss.IndexIVFPQ(
+                quantizer, self.dimension, IVFPQ_NLIST, m, IVFPQ_NBITS, faiss.METRIC_INNER_PRODUCT
+            )
+            index.nprobe = IVFPQ_NPROBE
+            return index
+        
+        if num_vectors >= HNSW_MIN_VECTORS:
+            if self.quantization is not None:
+                index = faiss.IndexHNSWSQ(
+                    self.dimension, SCALAR_QUANTIZER_TYPES[self.quantization], HNSW_M, faiss.METRIC_INNER_PRODUCT
+                )
+            else:
+                index = faiss.IndexHNSWFlat(self.dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            return index
+        
+        if self.quantization is not None:
+            return faiss.IndexScalarQuantizer(
+                self.dimension, SCALAR_QUANTIZER_TYPES[self.quantization], faiss.METRIC_INNER_PRODUCT
+            )
+        return faiss.IndexFlatIP(self.dimension)
+    
+    def build_index(self, documents: Iterable[Dict[str, str]]):
         """
         Build FAISS index from documents
         
         Args:
-            documents: List of document chunks with metadata
+            documents: Document chunks with metadata (a list or any iterable, e.g. a generator)
         """
+        # The chunks are kept for retrieval, so an iterable is collected once here
+        documents = list(documents)
         if not documents:
             logger.warning("No documents to index")
             return
@@ -36,19 +125,42 @@ class VectorStore:
         logger.info(f"Building FAISS index for {len(documents)} documents...")
         
         try:
-            # Extract texts
-            texts = [doc['text'] for doc in documents]
+            # Embed each distinct text once: boilerplate (headers, footers, disclaimers)
+            # repeats across pages and files, and its vector is shared by every copy
+            positions = {}
+            inverse = np.fromiter(
+                (positions.setdefault(doc['text'], len(positions)) for doc in documents),
+                dtype=np.intp,
+                count=len(documents)
+            )
+            unique_texts = list(positions)
             
-            # Generate embeddings
-            logger.info("Generating embeddings...")
-            embeddings = self.embedding_model.embed_batch(texts)
+            # Generate embeddings group by group into one preallocated matrix, so only
+            # one group's texts and intermediate arrays are alive at a time
+            logger.info(f"Generating embeddings for {len(unique_texts)} unique texts...")
+            embeddings = np.empty((len(unique_texts), self.dimension), dtype=np.float32)
+            for start in range(0, len(unique_texts), EMBED_GROUP_SIZE):
+                group = unique_texts[start:start + EMBED_GROUP_SIZE]
+                embeddings[start:start + len(group)] = self._embed_texts(group)
+            if len(unique_texts) < len(documents):
+                # Expand back to one row per document so FAISS ids match self.documents
+                embeddings = embeddings[inverse]
             
             # Create FAISS index
             logger.info("Creating FAISS index...")
-            self.index = faiss.IndexFlatL2(self.dimension)
+            index = self._create_index(len(embeddings))
+            # The matrix is owned by this call, so it is normalized in place
+            faiss.normalize_L2(embeddings)
+            
+            # Quantizing indexes learn their codebooks from the data first
+            if not index.is_trained:
+                logger.info(f"Training {type(index).__name__} on {len(embeddings)} vectors...")
+                index.train(embeddings)
             
             # Add vectors to index
-            self.index.add(embeddings.astype('float32'))
+            index.add(embeddings)
+            self.index = index
+            self._search_cache.clear()
             
             # Store documents
             self.documents = documents
@@ -59,6 +171,30 @@ class VectorStore:
             logger.error(f"Error building index: {str(e)}", exc_info=True)
             raise
     
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, reusing vectors from the embedding cache and encoding only the misses"""
+        if self.embedding_cache is None:
+            return self.embedding_model.embed_batch(texts)
+        
+        model_id = self.embedding_model.model_id
+        cached = self.embedding_cache.get_many(model_id, texts)
+        
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        missing = []
+        for i, vector in enumerate(cached):
+            if vector is None or vector.shape[0] != self.dimension:
+                missing.append(i)
+            else:
+                embeddings[i] = vector
+        
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            new_embeddings = self.embedding_model.embed_batch(missing_texts)
+            embeddings[missing] = new_embeddings
+            self.embedding_cache.put_many(model_id, missing_texts, new_embeddings)
+        return embeddings
+    
     def search(self, query: str, top_k: int = 5) -> List[Dict[str, str]]:
         """
         Search for similar documents
@@ -75,30 +211,195 @@ class VectorStore:
             return []
         
         try:
-            logger.info(f"Searching for: {query[:100]}...")
-            
-            # Generate query embedding
-            query_embedding = self.embedding_model.embed_text(query)
-            query_embedding = query_embedding.reshape(1, -1).astype('float32')
+            logger.debug(f"Searching for: {query[:100]}...")
+            # Exact repeats of a query are answered from the LRU cache
+            results = self.get_cached_results(query, top_k)
+            if results is None:
+                query_embedding = self.embedding_model.embed_text(query)
+                results = self._search_embeddings(query_embedding.reshape(1, -1), top_k)[0]
+                self._search_cache.put((query, top_k), results)
+                results = [doc.copy() for doc in results]
+            return results
+        except Exception as e:
+            logger.error(f"Error during search: {str(e)}", exc_info=True)
+            return []
+        
+    def get_cached_results(self, query: str, top_k: int = 5) -> Optional[List[Dict[str, str]]]:
+        """
+        Results of an earlier search for the same query, without embedding it
+        
+        Returns:
+            Copies of the cached results (so callers can't modify them), or None
+            if the query hasn't been searched since the index was built
+        """
+        results = self._search_cache.get((query, top_k))
+        return [doc.copy() for doc in results] if results is not None else None
+    
+    def search_batch(self, queries: List[str], top_k: int = 5) -> List[List[Dict[str, str]]]:
+        """
+        Search for similar documents for many queries at once
+        
+        The queries are embedded in one batch and searched with a single FAISS
+        call, which uses a matrix-matrix product instead of one scan per query.
+        
+        Args:
+            queries: Search queries
+            top_k: Number of top results to return per query
+        
+        Returns:
+            One list of top-k most similar documents per query
+        """
+        if self.index is None or self.index.ntotal == 0:
+            logger.warning("Index is empty or not built")
+            return [[] for _ in queries]
+        if not queries:
+            return []
+        
+        try:
+            logger.debug(f"Searching for a batch of {len(queries)} queries...")
+            query_embeddings = self.embedding_model.embed_batch(queries)
+            return self._search_embeddings(query_embeddings, top_k)
+        except Exception as e:
+            logger.error(f"Error during batch search: {str(e)}", exc_info=True)
+            return [[] for _ in queries]
+    
+    def search_by_embedding(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        query: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Search for similar documents using a precomputed query embedding
+        
+        Args:
+            query_embedding: Embedding of the search query
+            top_k: Number of top results to return
+            query: Text of the query; when given, the results are added to the
+                search LRU cache (see get_cached_results)
+        
+        Returns:
+            List of top-k most similar documents, each with its cosine similarity in 'score'
+        """
+        if self.index is None or self.index.ntotal == 0:
+            logger.warning("Index is empty or not built")
+            return []
+        
+        try:
+            results = self._search_embeddings(query_embedding.reshape(1, -1), top_k)[0]
+            if query is not None:
+                self._search_cache.put((query, top_k), results)
+                results = [doc.copy() for doc in results]
+            return results
+        except Exception as e:
+            logger.error(f"Error during search: {str(e)}", exc_info=True)
+            return []
             
-            # Search
-            k = min(top_k, self.index.ntotal)
-            distances, indices = self.index.search(query_embedding, k)
+    def _search_embeddings(self, query_embeddings: np.ndarray, top_k: int) -> List[List[Dict[str, str]]]:
+        """Search a (num_queries, dimension) matrix of query embeddings with one FAISS call"""
+        # One small copy (normalize_L2 works in place and the caller's vectors may be read-only)
+        query_embeddings = np.array(query_embeddings, dtype=np.float32)
+        faiss.normalize_L2(query_embeddings)
             
-            # Retrieve documents
+        # Search
+        k = min(top_k, self.index.ntotal)
+        scores, indices = self.index.search(query_embeddings, k)
+        
+        # Retrieve documents (approximate indexes pad missing results with -1)
+        all_results = []
+        for row_indices, row_scores in zip(indices, scores):
             results = []
-            for idx, distance in zip(indices[0], distances[0]):
-                if idx < len(self.documents):
+            for idx, score in zip(row_indices, row_scores):
+                if 0 <= idx < len(self.documents):
                     doc = self.documents[idx].copy()
-                    doc['distance'] = float(distance)
+                    doc['score'] = float(score)
                     results.append(doc)
+            all_results.append(results)
             
-            logger.info(f"Found {len(results)} results")
-            return results
+        logger.debug(f"Found {sum(len(results) for results in all_results)} results for {len(all_results)} queries")
+        return all_results
+    
+    def save(self, directory: str, fingerprint: str, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Save the index and its document chunks so a later process can reuse them
+        
+        Writes index.faiss, documents.json and manifest.json. The manifest is
+        written last (and removed first), so an interrupted save is never loaded.
+        
+        Args:
+            directory: Folder to save into (created if missing)
+            fingerprint: Identifies the corpus the index was built from (see load)
+            metadata: Extra JSON-serializable values returned by load
+        """
+        if self.index is None:
+            logger.warning("Index is not built, nothing to save")
+            return
+        
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, "manifest.json")
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        
+        faiss.write_index(self.index, os.path.join(directory, "index.faiss"))
+        with open(os.path.join(directory, "documents.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.documents, f, ensure_ascii=False)
+        
+        manifest = {
+            'fingerprint': fingerprint,
+            'model_id': self.embedding_model.model_id,
+            'quantization': self.quantization,
+            'metadata': metadata or {},
+        }
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+        logger.info(f"Saved index with {self.index.ntotal} vectors to {directory}")
+    
+    def load(self, directory: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Load an index saved by save, if it is still valid
+        
+        The saved index is used only if it was built from the same corpus
+        (fingerprint), embedding model and quantization; otherwise nothing changes.
+        
+        Args:
+            directory: Folder the index was saved into
+            fingerprint: Fingerprint of the current corpus
+        
+        Returns:
+            The metadata passed to save, or None if no valid index was loaded
+        """
+        manifest_path = os.path.join(directory, "manifest.json")
+        if not os.path.exists(manifest_path):
+            return None
+        
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if (
+                manifest.get('fingerprint') != fingerprint
+                or manifest.get('model_id') != self.embedding_model.model_id
+                or manifest.get('quantization') != self.quantization
+            ):
+                logger.info("Saved index is out of date, it will be rebuilt")
+                return None
             
+            index = faiss.read_index(os.path.join(directory, "index.faiss"))
+            with open(os.path.join(directory, "documents.json"), 'r', encoding='utf-8') as f:
+                documents = json.load(f)
+            if index.ntotal != len(documents) or index.d != self.dimension:
+                logger.warning("Saved index doesn't match its documents, it will be rebuilt")
+                return None
         except Exception as e:
-            logger.error(f"Error during search: {str(e)}", exc_info=True)
-            return []
+            logger.warning(f"Could not load saved index from {directory}: {str(e)}")
+            return None
+        
+        self.index = index
+        self.documents = documents
+        self._search_cache.clear()
+        logger.info(f"Loaded saved index with {index.ntotal} vectors from {directory}")
+        return manifest.get('metadata', {})
     
     def get_index_size(self) -> int:
         """Get the number of vectors in the index"""